@@ -7,12 +7,17 @@ import sys
 # sys.path.append(path.join(fp, "parse"))
 # sys.path.append(path.join(fp, "util"))
 
-from gui import app
+from multiprocessing import freeze_support
 
-sys.excepthook = lambda cls, e, t: sys.__excepthook__(cls, e, t)
+if __name__ == "__main__": # export engine workers are spawned and import this module again
+	freeze_support()
 
-app = app.App(sys.argv)
+	from gui import app
 
-exitCode = app.exec_()
+	sys.excepthook = lambda cls, e, t: sys.__excepthook__(cls, e, t)
 
-sys.exit(exitCode)
\ No newline at end of file
+	app = app.App(sys.argv)
+
+	exitCode = app.exec_()
+
+	sys.exit(exitCode)
\ No newline at end of file
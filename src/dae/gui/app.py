@@ -18,11 +18,14 @@ from util.assetmanager import AssetManager
 from util.settings import SETTINGS
 from parse.gameres import GameResDesc
 from parse.realres import GeomNodeTree, DynModel, RendInst, CollisionGeom
-from parse.material import DDSx
+from parse.material import DDSx, DDSxTexturePack2
 from parse.dbld import DagorBinaryLevelData
 from util.assetcacher import AssetCacher
 from util.enums import *
 from util.terminable import Exportable, Pack, Terminable
+from util.exportengine import ExportEngine
+from util.decompression import DECOMPRESSED_CACHE
+from util.filepool import FILE_POOL
 from gui.settingsDialog import SettingsDialog
 from functools import partial
 from traceback import format_exc
@@ -80,6 +83,7 @@ class MainWindow(QMainWindow):
 
 	actionOpenFolder:QAction
 	actionOpenFiles:QAction
+	actionIndexTextures:QAction
 	actionUnmount:QAction
 	actionClose:QAction
 	actionSettings:QAction
@@ -103,6 +107,7 @@ class MainWindow(QMainWindow):
 		self.actionClose.triggered.connect(self.close)
 		self.actionOpenFolder.triggered.connect(self.openFolder)
 		self.actionOpenFiles.triggered.connect(self.openAssets)
+		self.actionIndexTextures.triggered.connect(self.indexTextures)
 		# self.actionOpenMap.triggered.connect(self.openMap)
 		self.actionUnmount.triggered.connect(self.unmountAssets)
 		self.actionSettings.triggered.connect(self.openSettings)
@@ -119,6 +124,9 @@ class MainWindow(QMainWindow):
 
 		self.cachedIcons:dict[str:QIcon] = {}
 
+		DECOMPRESSED_CACHE.setBudget(SETTINGS.getValue(SETTINGS_DECOMPRESSED_CACHE_SIZE) * 0x100000)
+		FILE_POOL.setMaxFiles(SETTINGS.getValue(SETTINGS_FILE_POOL_SIZE))
+
 		self.mapTab.mainWindow = self
 		
 		self.show()
@@ -139,6 +147,14 @@ class MainWindow(QMainWindow):
 		self.treeView.clear()
 		AssetCacher.clearCache()
 
+		log.log(f"Decompressed block cache: {DECOMPRESSED_CACHE.getStats()}")
+		DECOMPRESSED_CACHE.clear()
+		DECOMPRESSED_CACHE.resetStats()
+
+		log.log(f"File pool: {FILE_POOL.getStats()}")
+		FILE_POOL.clear()
+		FILE_POOL.resetStats()
+
 		gc.collect()
 
 	
@@ -165,6 +181,37 @@ class MainWindow(QMainWindow):
 		
 		self.mountAssets(dialog.selectedFiles())
 	
+	def indexTextures(self):
+		dialog = openFile(title = "Index texture folder", fileMode = QFileDialog.DirectoryOnly)
+
+		if dialog is None:
+			return
+		
+		self.threadPool.start(partial(self.__indexTexturesInternal__, dialog.selectedFiles()))
+	
+	def __indexTexturesInternal__(self, paths:list[str]):
+		# reads every texture pack table into the asset index without mounting them, models then only open the packs they need
+		self.setRequestedDialog(DIALOG_STATUS)
+		
+		self.setTaskTitle("Indexing textures")
+		self.setTaskStatus("Looking for texture packs...")
+
+		for p in paths:
+			iterator = QDirIterator(p, [f"*.{DDSxTexturePack2.fileExtension}"], QDir.Files | QDir.NoSymLinks, QDirIterator.Subdirectories)
+
+			while iterator.hasNext() and not self.shouldTerminate:
+				filePath = iterator.next()
+
+				self.setTaskStatus(f"Indexing {filePath}")
+
+				try:
+					DDSxTexturePack2(filePath) # building its table registers its textures
+				except Exception:
+					log.log(f"Couldn't index '{filePath}'", LOG_ERROR)
+					print(format_exc())
+		
+		self.setRequestedDialog(DIALOG_NONE)
+	
 	def openLevelFile(self, enlisted:bool):
 		dialog = openFile(title = "Open level file", nameFilters = DBLD_FILTER, fileMode = QFileDialog.ExistingFile)
 
@@ -260,11 +307,8 @@ class MainWindow(QMainWindow):
 				if isDesc:
 					grd = GameResDesc(absFilePath)
 
-					AssetCacher.appendGameResDesc(grd)
-
-					self.setTerminable(grd)
-					grd.loadDataBlock()
-					self.clearTerminable()
+					AssetCacher.appendGameResDesc(grd) # its summary is only loaded once a model asks for it
+					AssetCacher.addMountedFile(absFilePath)
 
 					success = True
 				else:
@@ -285,6 +329,8 @@ class MainWindow(QMainWindow):
 							
 							parent.appendRow(item.getRow())
 
+							AssetCacher.addMountedFile(absFilePath)
+
 							success = True
 					except Exception as ex:
 						log.log(f"Couldn't initialize '{absFilePath}'", LOG_ERROR)
@@ -332,7 +378,7 @@ class MainWindow(QMainWindow):
 		item = AssetItem(self, finfo, self.getIcon(asset.iconName), asset, parentAsset)
 		
 		if isinstance(asset, Pack):
-			for v in asset.getPackedFiles():
+			for v in asset.getPackedFiles(): # builds every entry, the tree and the AssetCacher need all of them
 				handleCaching(v)
 
 				item.mainItem.appendRow(self.getAssetItem(v, None, item).getRow())
@@ -340,6 +386,10 @@ class MainWindow(QMainWindow):
 		return item
 
 	
+	def getExportEngine(self):
+		# worker processes remount everything that is mounted here
+		return ExportEngine(AssetCacher.getMountedFiles(), SHOULD_CACHE)
+	
 	def terminateThreads(self):
 		print("!!! Terminating thread !!!")
 
@@ -397,20 +447,19 @@ class MapLoadThread(QRunnable):
 
 			map.computeData()
 
-			mainWindow.setTaskStatus("Loading cell entities...")
+			mainWindow.setTaskStatus("Counting cell entities...")
 
 			riGen = map.riGenLayers[0]
 
 			for ofs in riGen.riDataRel:
 				cell = riGen.riDataRel[ofs]
 
-				entities = {}
-				_, nonVegCnt, vegCnt = riGen.getCellEntities(cell.id, entities, self.enlisted, False, True)
+				nonVegCnt, vegCnt, entityCnt = riGen.getCellStats(cell.id) # cells are only decompressed once exported
 				cellData.append((cell.id,
 								riGen.getCellXY(cell), 
 								nonVegCnt,
 								vegCnt,
-								len(entities)))
+								entityCnt))
 			
 			self.sig.finished.emit()
 		except Exception as e:
@@ -10,6 +10,8 @@ from PyQt5.QtCore import QMimeData, Qt, QSortFilterProxyModel, QPoint, QFileInfo
 from PyQt5.QtGui import QDragEnterEvent, QDragMoveEvent, QDropEvent, QStandardItemModel, QStandardItem, QIcon, QPaintEvent, QPainter
 from util.misc import formatBytes, getResPath, openFile, ROOT_FOLDER, LIB_FOLDER
 from util.terminable import Exportable, Packed, Pack, Terminable
+from util.exportengine import ExportEngine, saveTask, exportDDSTask, exportModelTask
+from util.texturepipeline import TexturePipeline
 from util.enums import *
 from pyperclip import copy as copyToClipboard
 from functools import partial
@@ -413,6 +415,10 @@ class AssetSaveAction(SaveAction):
 	def saveAsset(self, output:str, asset):
 		raise NotImplementedError()
 	
+	def getWorkerTask(self, output:str, asset) -> tuple:
+		# picklable counterpart of saveAsset for the export engine: (module level function, args after the asset)
+		raise NotImplementedError()
+	
 	def save(self, output:str):
 		asset:Packed = self.item.asset
 		
@@ -429,33 +435,56 @@ class PackedSave(AssetSaveAction):
 		self.setTerminable(asset)
 
 		packedFiles = asset.getPackedFiles()
+		indices = range(len(packedFiles)) # of each file in the pack, what the export engine sends to its workers
 
 		if self.hasFilter:
-			fileCnt = 0
+			indices = [k for k, v in enumerate(packedFiles) if self.filter(v)]
+			packedFiles = [packedFiles[k] for k in indices]
 
-			for v in packedFiles:
-				if self.filter(v):
-					fileCnt += 1
-		else:
-			fileCnt = len(packedFiles)
+		fileCnt = len(packedFiles)
+		engine:ExportEngine = None
 
-		k = 0
+		if fileCnt >= EXPORT_POOL_MIN_JOBS:
+			engine = self.getExportEngine()
 
-		for v in packedFiles:
-			if self.hasFilter and not self.filter(v):
-				continue
+		if engine is None or engine.workers <= 1:
+			self.saveInline(output, packedFiles)
+		else:
+			self.savePooled(output, asset, packedFiles, indices, engine)
+		
+		self.clearTerminable()
+	
+	def saveInline(self, output:str, packedFiles:list[Packed]):
+		fileCnt = len(packedFiles)
 
+		for k, v in enumerate(packedFiles):
 			self.setTaskStatus(f"{self.getProgressText(v)} ({k + 1}/{fileCnt})")
 
 			if self.saveSingle(output, v):
 				break
 				
 			self.setTaskProgress((k + 1) / fileCnt)
+	
+	def savePooled(self, output:str, pack:Pack, packedFiles:list[Packed], indices:list[int], engine:ExportEngine):
+		fileCnt = len(packedFiles)
 
-			k += 1
-		
-		self.clearTerminable()
+		if self.handleTermination(engine):
+			return
+
+		jobs = [(idx, *self.getWorkerTask(output, v)) for idx, v in zip(indices, packedFiles)]
+
+		for k, (idx, error) in enumerate(engine.run(pack, jobs)):
+			if error is not None:
+				print(error)
+
+				self.setErrored()
+			
+			self.setTaskStatus(f"{self.getProgressText(packedFiles[idx])} ({k + 1}/{fileCnt})")
+			self.setTaskProgress((k + 1) / fileCnt)
 	
+	def getExportEngine(self) -> ExportEngine:
+		return self.mainWindow.getExportEngine()
+
 	@classmethod
 	@property
 	def hasFilter(cls):
@@ -482,6 +511,9 @@ class Extract(AssetSaveAction):
 
 	def saveAsset(self, output:str, asset:Packed):
 		asset.save(output)
+	
+	def getWorkerTask(self, output:str, asset:Packed):
+		return saveTask, (output, )
 
 class ExtractAll(Extract, PackedSave):
 	@property
@@ -498,6 +530,9 @@ class ExtractAll(Extract, PackedSave):
 	def getProgressText(self, asset:Packed):
 		return f"Extracting {asset.name}.{asset.fileExtension}"
 
+	def getExportEngine(self):
+		return None # plain copies are I/O bound, workers would spend longer remounting everything
+
 
 class ExportToDDS(Extract):
 	@property
@@ -510,6 +545,9 @@ class ExportToDDS(Extract):
 
 	def saveAsset(self, output:str, asset:DDSx):
 		asset.exportDDS(output)
+	
+	def getWorkerTask(self, output:str, asset:DDSx):
+		return exportDDSTask, (output, )
 
 class ExportAllToDDS(ExportToDDS, PackedSave):
 	@property
@@ -523,6 +561,27 @@ class ExportAllToDDS(ExportToDDS, PackedSave):
 	def getProgressText(self, asset:Packed):
 		return f"Extracting {asset.name}.dds"
 	
+	def getExportEngine(self):
+		return None # decompression releases the GIL, threads are enough and don't have to remount everything
+	
+	def saveInline(self, output:str, packedFiles:list[DDSx]):
+		fileCnt = len(packedFiles)
+		pipeline = TexturePipeline()
+
+		if self.handleTermination(pipeline):
+			return
+
+		jobs = [(v.buildDDS, (output, ), v.getMemSize()) for v in packedFiles]
+
+		for k, (idx, error) in enumerate(pipeline.run(jobs)):
+			if error is not None:
+				print(error)
+
+				self.setErrored()
+			
+			self.setTaskStatus(f"{self.getProgressText(packedFiles[idx])} ({k + 1}/{fileCnt})")
+			self.setTaskProgress((k + 1) / fileCnt)
+	
 
 class PreviewModel(CustomAction):
 	def __init__(self, parent, item: SimpleItem, lod:int):
@@ -767,6 +826,13 @@ class ExportModel(AssetSaveAction):
 		
 		getattr(mdl, self.exportMethodName)(output, exportTex, forceConvert)
 	
+	def getWorkerTask(self, output:str, asset:RendInst):
+		return exportModelTask, (output,
+			   self.lod,
+			   self.exportMethodName,
+			   not SETTINGS.getValue(SETTINGS_NO_TEX_EXPORT),
+			   SETTINGS.getValue(SETTINGS_FORCE_DDS_CONVERSION))
+	
 	@property
 	def actionText(self) -> str:
 		return f"Export LOD {self.lod} to {self.exportFormat.upper()}"
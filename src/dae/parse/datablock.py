@@ -5,8 +5,13 @@ sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
 import util.log as log
 from util.fileread import *
-from struct import unpack
+from struct import unpack_from
+from sys import intern
+from itertools import accumulate
 from util.enums import *
+import numpy as np
+
+KNOWN_PARAM_TYPES = (0x1000000, 0x2000000, 0x6000000, 0x9000000)
 
 class DataBlock:
 	def __init__(self, nameId:int, paramsCount:int, blocksCount:int, firstBlockId:int, ofs:int, sharedBlk = None, parent = None):
@@ -19,6 +24,8 @@ class DataBlock:
 		self.__sharedBlk:SharedDataBlock = sharedBlk
 
 		self.__dataBlocks:list[DataBlock] = []
+		self.__childIndex:dict[str, DataBlock] = None
+		self.__paramIndex:dict[str, int] = None
 	
 	def __repr__(self):
 		return f"<blk nid={self.__nameId} pcnt={self.__paramsCount} bcnt={self.__blocksCount} fblock={self.__firstBlockId} ofs={self.__ofs}>"
@@ -38,6 +45,14 @@ class DataBlock:
 	def addDataBlock(self, blk):
 		blk.__parent = self
 		self.__dataBlocks.append(blk)
+		self.__childIndex = None
+	
+	def addDataBlocks(self, blks:list):
+		for blk in blks:
+			blk.__parent = self
+		
+		self.__dataBlocks.extend(blks)
+		self.__childIndex = None
 
 	def getNameId(self):
 		return self.__nameId
@@ -76,74 +91,59 @@ class DataBlock:
 		return self.__dataBlocks[index]
 	
 	def getByName(self, index:str):
-		for blk in self.__dataBlocks:
-			if self.__sharedBlk.getBlockName(blk.__nameId - 1) == index:
-				return blk
+		if self.__childIndex is None:
+			childIndex = {}
+
+			for blk in self.__dataBlocks:
+				childIndex.setdefault(self.__sharedBlk.getBlockName(blk.__nameId - 1), blk)
+			
+			self.__childIndex = childIndex
+
+		return self.__childIndex.get(index)
 	
 	def getParamName(self, pId:int):
 		if pId < 0 or pId >= self.getParamsCount():
 			raise IndexError(pId)
 		
+		sharedBlk = self.__sharedBlk
 
-		params:BinFile = self.__sharedBlk.params
-		# data:bytes = self.__sharedBlk.paramsData
-
-		params.seek(self.getOfs() + pId * 8, 0)
-
-		return self.__sharedBlk.sharedNameMap[(readInt(params) & 0x0FFFFFF) - 1]
+		return sharedBlk.sharedNameMap[sharedBlk.paramNameIds[self.__ofs // 8 + pId]]
 	
 	def getParamNameByFlags(self, flags:int):
 		return self.__sharedBlk.sharedNameMap[(flags & 0x0FFFFFF) - 1]
 
 	def getParamByName(self, name:str):
-		nameMap = self.__sharedBlk.sharedNameMap
-
-		for i in range(self.getParamsCount()):
-			param = self.getParamById(i)
+		if self.__paramIndex is None:
+			sharedBlk = self.__sharedBlk
+			nameMap = sharedBlk.sharedNameMap
+			nameIds = sharedBlk.paramNameIds
+			start = self.__ofs // 8
+			index = {}
+
+			for i in range(self.getParamsCount()):
+				index.setdefault(nameMap[nameIds[start + i]], i)
+			
+			self.__paramIndex = index
+		
+		pId = self.__paramIndex.get(name)
 
-			if nameMap[(param[0] & 0x0FFFFFF) - 1] == name:
-				return param
+		if pId is None:
+			raise IndexError(name)
 		
-		raise IndexError(name)
+		return self.getParamById(pId)
 
 	def getParamById(self, pId:int):
 		if pId < 0 or pId >= self.getParamsCount():
 			raise IndexError(pId)
 		
+		sharedBlk = self.__sharedBlk
+		idx = self.__ofs // 8 + pId
+		flags = sharedBlk.paramFlags[idx]
 
-		params:BinFile = self.__sharedBlk.params
-		data:bytes = self.__sharedBlk.paramsData
+		if not flags & 0xF000000 in KNOWN_PARAM_TYPES:
+			log.log(f"{self.getName()}: Unknown flags {hex(flags)} val={sharedBlk.paramValues[idx]} ofs={self.getOfs()}", LOG_WARN)
 
-		params.seek(self.getOfs() + pId * 8, 0)
-
-		flags = readInt(params)
-		val = readInt(params)
-
-		blockType = flags & 0xF000000
-
-		if blockType == 0x1000000:
-			dataSlice = data[val:]
-
-			val = ""
-
-			for k, c in enumerate(dataSlice):
-				if c == 0:
-					val += dataSlice[:k].decode("ascii")
-
-					break
-			
-		elif blockType == 0x2000000:
-			pass # this blocktype means val = val, in gameresdesc it means val = tex[val], which implies that val is a tex idx
-		elif blockType == 0x6000000:
-			val = unpack("ffff", data[val:val + 0x10])
-		elif blockType == 0x9000000:
-			val = True
-		else:
-			log.log(f"{self.getName()}: Unknown flags {hex(flags)} val={val} ofs={self.getOfs()}", LOG_WARN)
-			# ...
-			
-
-		return (flags, val)
+		return (flags, sharedBlk.paramValues[idx])
 
 class SharedDataBlock(DataBlock):
 	def __init__(self, *args):
@@ -162,23 +162,54 @@ class SharedDataBlock(DataBlock):
 		self.sharedNameMap:list[str] = args[1]
 		self.paramsData:bytes = args[2]
 		self.params:BinFile = args[3]
+
+		self.__decodeParams()
+	
+	def __decodeParams(self):
+		# columnar view of the whole params table, DataBlock.getOfs() // 8 is a block's first row
+		self.params.seek(0, 0)
+
+		raw = np.frombuffer(self.params.read(), "<u4").reshape(-1, 2)
+		data = bytes(self.paramsData)
+		
+		self.paramFlags:list[int] = raw[:, 0].tolist()
+		self.paramNameIds:list[int] = ((raw[:, 0] & 0x0FFFFFF).astype(np.int64) - 1).tolist()
+
+		values = raw[:, 1].tolist()
+		strings:dict[int, str] = {}
+
+		for i, flags in enumerate(self.paramFlags):
+			blockType = flags & 0xF000000
+			val = values[i]
+
+			if blockType == 0x1000000:
+				string = strings.get(val)
+
+				if string is None:
+					end = data.find(b"\x00", val)
+					string = strings[val] = intern(str(data[val:end], "utf-8", "replace")) if end != -1 else ""
+				
+				values[i] = string
+			elif blockType == 0x2000000:
+				pass # this blocktype means val = val, in gameresdesc it means val = tex[val], which implies that val is a tex idx
+			elif blockType == 0x6000000:
+				if val + 0x10 <= len(data):
+					values[i] = unpack_from("ffff", data, val)
+			elif blockType == 0x9000000:
+				values[i] = True
+		
+		self.paramValues:list = values
 	
 	def getBlockName(self, index:int):
 		return self.sharedNameMap[index]
 
 	def getByName(self, index:str):
-		if not index in self.sharedNameMap:
-			raise IndexError(index)
-		else:
-			i = self.sharedNameMap.index(index)
+		blk = super().getByName(index)
 
-			for blk in self.getChildren():
-				nid = blk.getNameId() - 1
-				
-				if i == nid:
-					return blk
-				
+		if blk is None:
 			raise IndexError(index)
+		
+		return blk
 
 
 def loadDataBlock(file:BinFile):
@@ -187,7 +218,7 @@ def loadDataBlock(file:BinFile):
 	baseNamesNum = decodeVLQ(file, 1, 5, shift = 7)
 	baseNamesSize = decodeVLQ(file, 1, 5, shift = 7)
 
-	sharedNames = tuple(file.read(baseNamesSize)[2:].decode("utf-8").split("\x00")[:-1])
+	sharedNames = tuple(str(file.read(baseNamesSize)[2:], "utf-8").split("\x00")[:-1])
 	
 	blocksCount = decodeVLQ(file, 7, 0x23, lambda val: val >= 0)
 	paramsCount = decodeVLQ(file, 7, 0x23, lambda val: (val & 0x80) == 0)
@@ -206,23 +237,10 @@ def loadDataBlock(file:BinFile):
 	log.log(f"Data offset:  {offset}")
 	log.log(f"Parsing {blocksCount} blocks...")
 
-	offset = 0
-	firstBlockId = 0
-
-	for i in range(blocksCount):
-		nameId = decodeVLQ(file, 7, 0x23) - 1
-		paramsCount = decodeVLQ(file, 7, 0x15)
-		blocksCnt = decodeVLQ(file, 7, 0x15)
-		
-		
-		if blocksCnt != 0:
-			firstBlockId = decodeVLQ(file, 7, 0x23)
-		
-		blk = DataBlock(nameId, paramsCount, blocksCnt, firstBlockId, offset)
-		# print(blk)
-		offset += 8 * paramsCount
+	nameIds, paramCounts, blockCounts, firstBlockIds = readBlockHeaders(file, blocksCount)
+	offsets = accumulate(paramCounts[:-1], lambda ofs, cnt: ofs + 8 * cnt, initial = 0)
 
-		dataBlocks.append(blk)
+	dataBlocks = list(map(DataBlock, nameIds, paramCounts, blockCounts, firstBlockIds, offsets))
 
 	# file.close()
 
@@ -239,8 +257,39 @@ def loadDataBlock(file:BinFile):
 		
 		fBlock = blk.getFirstBlockId()
 
-		for i in range(blk.getblocksCount()):
-			blk.addDataBlock(dataBlocks[fBlock + i])
+		blk.addDataBlocks(dataBlocks[fBlock:fBlock + blk.getblocksCount()])
 	
 	return sharedBlk
 
+def readBlockHeaders(file:BinFile, blocksCount:int):
+	# a header is 3 or 4 VLQs of at most 5 bytes (nameId, paramsCount, blocksCount, firstBlockId if it has children)
+	regionSize = min(blocksCount * 16, file.getSize() - file.tell())
+	values, ends = decodeVLQArray(file.read(regionSize))
+
+	nameIds = [0] * blocksCount
+	paramCounts = [0] * blocksCount
+	blockCounts = [0] * blocksCount
+	firstBlockIds = [0] * blocksCount
+
+	k = 0
+	firstBlockId = 0
+
+	try:
+		for i in range(blocksCount):
+			nameIds[i] = values[k] - 1
+			paramCounts[i] = values[k + 1]
+			blockCounts[i] = values[k + 2]
+			k += 3
+
+			if blockCounts[i] != 0:
+				firstBlockId = values[k]
+				k += 1
+			
+			firstBlockIds[i] = firstBlockId
+	except IndexError:
+		raise Exception(f"Truncated block headers: {i}/{blocksCount} blocks decoded")
+	
+	file.seek((ends[k - 1] if k > 0 else 0) - regionSize, 1) # give back what was read past the headers
+
+	return nameIds, paramCounts, blockCounts, firstBlockIds
+
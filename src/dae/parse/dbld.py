@@ -25,7 +25,7 @@ get_v482.restype = None
 
 
 def formatMagic(magic:bytes):
-	return magic.decode("utf-8").replace("\x00", "")
+	return str(magic, "utf-8").replace("\x00", "")
 
 
 class RoHugeHierBitMap2d:
@@ -94,6 +94,61 @@ class DagorBinaryLevelData(Exportable):
 	
 	def __init__(self, filePath:str, name:str = None, size:int = 0):
 		super().__init__(filePath, name, size)
+
+		self.__file:BinFile = None
+		self.tagDirectory:dict[str, tuple[int, int]] = {} # tag name -> (offset, size) of its data
+		self.__blocks:dict[str] = {}
+	
+	def getTagBlock(self, tagName:str) -> BinBlock:
+		if not tagName in self.tagDirectory:
+			return None
+		
+		ofs, size = self.tagDirectory[tagName]
+
+		self.__file.seek(ofs, 0)
+
+		return self.__file.readBlock(size)
+	
+	def getBlock(self, tagName:str):
+		# whatever processBin makes of a tag, it is only parsed the first time it is asked for
+		if not tagName in self.__blocks:
+			block = self.getTagBlock(tagName)
+
+			if block is None:
+				self.__blocks[tagName] = None
+			else:
+				log.log(f"Processing {tagName}")
+				log.addLevel()
+
+				self.__blocks[tagName] = self.processBin(tagName, block, self.tagDirectory[tagName][0])
+
+				log.subLevel()
+		
+		return self.__blocks[tagName]
+	
+	@property
+	def riGenLayers(self) -> list:
+		return self.getBlock("RIGz")
+	
+	@property
+	def lmap(self):
+		return self.getBlock("lmap")
+	
+	@property
+	def sceneMVD(self) -> MatVData:
+		return self.getBlock("SCN")
+	
+	@property
+	def hm2CData(self) -> CompressedData:
+		return self.getBlock("HM2")
+	
+	@property
+	def resList(self) -> tuple[str]:
+		return self.getBlock("RqRL")
+	
+	@property
+	def dxpList(self) -> tuple[str]:
+		return self.getBlock("DxP2")
 	
 	def readTexName(self, file):
 		sz = readInt(file)
@@ -477,27 +532,69 @@ class DagorBinaryLevelData(Exportable):
 			return (ctypes.c_int * 4)(*unpack("4i", mem_addr[:8] + b"\x00" * 8)) #8h
 		
 		def processRiDataRel(self, file:BinBlock):
-			self.riDataRelFiles = {}
-
-			for riDataRelIdx, riDataRelOfs in enumerate(self.riDataRel):
-				riDataRelOfs = file.tell()
+			# cells are only decompressed once their entities are asked for, see getRiDataRel
+			self.riDataRelBlock = file
+			self.riDataRelFiles:dict[int, BinFile] = {}
+		
+		def getRiDataRel(self, riDataRelOfs:int) -> BinFile:
+			riDataRel = self.riDataRelFiles.get(riDataRelOfs)
 
+			if riDataRel is None:
 				cell:DagorBinaryLevelData.RendInstGenData.Cell = self.riDataRel[riDataRelOfs]
 
-				log.log(f"Cell {cell.id}: RiDataRel {riDataRelIdx} @ {riDataRelOfs} [{cell}]")
-				log.addLevel()
-
-				file.seek(riDataRelOfs, 0)
-
-				riDataRel = BinFile(CompressedData(file).decompress())
+				log.log(f"Cell {cell.id}: RiDataRel @ {riDataRelOfs} [{cell}]")
 
-				self.riDataRelFiles[riDataRelOfs] = riDataRel
+				self.riDataRelBlock.seek(riDataRelOfs, 0)
 
+				riDataRel = self.riDataRelFiles[riDataRelOfs] = BinFile(CompressedData(self.riDataRelBlock).decompress())
 
 				# for k, v in enumerate(cell.entCnt):
 				# 	log.log(f"{k}: idx={v} ({hex(self.entCnt[v].riResIdxHigh)}) {hex(self.entCnt[v].riCount)} x [{hex(self.entCnt[v].riResIdxLow)}]{self.pregenEnts[self.entCnt[v].riResIdxLow].riName} = {hex(self.entCnt[v].raw)}")
-				
-				log.subLevel()
+			
+			return riDataRel
+		
+		def getCellScale(self, cell):
+			if cell.htDelta == 0:
+				htDelta = 0x2000
+			else:
+				htDelta = cell.htDelta
+			
+			cell_xz_sz = self.cellSz * self.grid2world
+
+			v482 = (ctypes.c_float * 5)()
+			get_v482(v482, cell_xz_sz, htDelta)
+			v482 = v482[:4]
+
+			self.calculatedScale = v482
+
+			return v482
+		
+		def getCellStats(self, cellId:int):
+			# (prop count, vegetation count, entity type count) of a cell, read from its counters without decompressing it
+			cell = self.cells[cellId]
+
+			self.getCellScale(cell)
+
+			nonVegCnt = 0
+			vegCnt = 0
+			names = set()
+
+			for i in SafeRange(self, 65):
+				entCnterIdx = cell.entCnt[i]
+				nextCnterIdx = entCnterIdx if i == 64 else cell.entCnt[i + 1]
+
+				for idx in SafeRange(self, entCnterIdx, nextCnterIdx):
+					entCnter = self.entCnt[idx]
+					ent = self.pregenEnts[((entCnter.raw >> 20) & 0xC00) | (entCnter.raw & 0x3FF)]
+
+					names.add(ent.riName)
+
+					if ent.posInst == 0:
+						nonVegCnt += entCnter.riCount
+					else:
+						vegCnt += entCnter.riCount
+			
+			return nonVegCnt, vegCnt, len(names)
 		
 		def getCellEntities(self, cellId:int, entities:dict[str, list[tuple[float, float, float, float]]] = {}, enlisted:bool = False, vegetation:bool = False, vegetationOnly:bool = False):
 			cell = self.cells[cellId]
@@ -508,18 +605,13 @@ class DagorBinaryLevelData(Exportable):
 			log.log(f"Gathering entities for cell {cellId}")
 			log.addLevel()
 
-			riData:BinFile = self.riDataRelFiles[cell.riDataRelOfs]
+			riData:BinFile = self.getRiDataRel(cell.riDataRelOfs)
 			riData.seek(0, 0)
 			# riData.quickSave(f"abandoned_factory_0_{cellId}.rirel")
 
 			x = cell.id % self.numCellW
 			z = cell.id // self.numCellW
 
-			if cell.htDelta == 0:
-				htDelta = 0x2000
-			else:
-				htDelta = cell.htDelta
-			
 			cellOrigin = (
 				(self.grid2world * x * self.cellSz) + self.world0Vxz[0],
 				cell.htMin,
@@ -527,13 +619,8 @@ class DagorBinaryLevelData(Exportable):
 				1.0)
 			
 			dz = self.cellSz * self.grid2world * 0.125
-			cell_xz_sz = self.cellSz * self.grid2world
 
-			v482 = (ctypes.c_float * 5)()
-			get_v482(v482, cell_xz_sz, htDelta)
-			v482 = v482[:4]
-
-			self.calculatedScale = v482
+			v482 = self.getCellScale(cell)
 
 			scaleFix = (
 				(1, 0, 0, 0),
@@ -737,7 +824,7 @@ class DagorBinaryLevelData(Exportable):
 				for i in range(texCnt):
 					next = texCnt == i + 1 and -1 or readInt(file) - 0x10
 					
-					nameMap.append(nameMapData[prev:next].decode("utf-8").rstrip("\x00"),)
+					nameMap.append(str(nameMapData[prev:next], "utf-8").rstrip("\x00"),)
 					
 					prev = next
 				
@@ -823,10 +910,12 @@ class DagorBinaryLevelData(Exportable):
 
 			indexList = tuple(readLong(file) for i in range(cnt))
 
-			self.resList = tuple(nameList[indexList[k] - indexList[0]:indexList[k + 1] - indexList[0]][:-1].decode("utf-8") for k in range(len(indexList) - 1))
+			resList = tuple(str(nameList[indexList[k] - indexList[0]:indexList[k + 1] - indexList[0]][:-1], "utf-8") for k in range(len(indexList) - 1))
 			
-			for k, v in enumerate(self.resList):
+			for k, v in enumerate(resList):
 				log.log(f"{k}:	{v}")
+			
+			return resList
 		elif name == "DxP2":
 			unknown = readInt(file)
 			listSz = readInt(file)
@@ -834,10 +923,12 @@ class DagorBinaryLevelData(Exportable):
 
 			padding = lambda x: x + (4 - (x % 4) if x % 4 != 0 else 0)
 
-			self.dxpList = tuple(formatMagic(file.read(padding(readInt(file)))) for i in range(listCnt))
+			dxpList = tuple(formatMagic(file.read(padding(readInt(file)))) for i in range(listCnt))
 
-			for k, v in enumerate(self.dxpList):
+			for k, v in enumerate(dxpList):
 				log.log(f"{k}:	{v}")
+			
+			return dxpList
 		elif name == "TEX":
 			sz = readInt(file)
 			# name = file.read(sz)
@@ -846,7 +937,7 @@ class DagorBinaryLevelData(Exportable):
 		elif name == "TEX.":
 			pass
 		elif name == "lmap":
-			self.lmap = self.LandMeshManager(file, self.name, self.filePath)
+			return self.LandMeshManager(file, self.name, self.filePath)
 		elif name == "HM2":
 			# if True:
 			# 	return
@@ -856,8 +947,10 @@ class DagorBinaryLevelData(Exportable):
 			log.log(f"{3}: {unpack('IIII', file.read(0x4 * 4))}")
 
 			try:
-				self.hm2CData = CompressedData(file)
-				self.hm2CData.decompress(self.name + ".hm2")
+				hm2CData = CompressedData(file)
+				hm2CData.dump(self.name + ".hm2")
+
+				return hm2CData
 			except Exception as er:
 				log.log(f"Decompession failed: {er}", LOG_ERROR)
 		elif name == "RIGz":
@@ -873,7 +966,7 @@ class DagorBinaryLevelData(Exportable):
 
 			sz = file.getSize()
 
-			self.riGenLayers:list[DagorBinaryLevelData.RendInstGenData] = []
+			riGenLayers:list[DagorBinaryLevelData.RendInstGenData] = []
 			
 			for layerIdx in range(2):
 				layerName = "primary" if layerIdx == 0 else "secondary"
@@ -895,7 +988,7 @@ class DagorBinaryLevelData(Exportable):
 				riGen = self.processBin("RIGzPrim", BinFile(pack("B", layerIdx) + cData), ofs + absOfs) # ADD ONE BYTE TO IDENTIFY LAYER IDX
 				riGen.ofs = ofs + absOfs
 				
-				self.riGenLayers.append(riGen)
+				riGenLayers.append(riGen)
 				
 				riGen.processRiDataRel(file.readBlock(readInt(file)))
 				# riGen.processRiDataRel(file.readBlock(readInt(file)), self.name, layerName)
@@ -924,6 +1017,8 @@ class DagorBinaryLevelData(Exportable):
 
 				RendInstGenData::initRender
 				"""
+
+			return riGenLayers
 		elif name == "SCN":
 			header = file.readBlock(56)
 
@@ -945,9 +1040,9 @@ class DagorBinaryLevelData(Exportable):
 						name = self.name + "_scn")
 			rest = BinFile(zlibDecompress(file.read(file.getSize() - file.tell())))
 
-			self.sceneMVD = mvd
-			
 			log.log(mvd)
+
+			return mvd
 		elif name == "RIGzPrim":
 			idx = readByte(file)
 			riGenDataSz = readInt(file)
@@ -997,7 +1092,17 @@ class DagorBinaryLevelData(Exportable):
 			log.log("Processing LandRayTracerDump:")
 			log.addLevel()
 
-			self.processBin("ltdu", BinFile(cdata.decompress(self.name + ".ltdu")), 0)
+			ltduName = self.name + ".ltdu"
+
+			if cdata.dump(ltduName): # parse the dump instead of keeping a second copy of it in memory
+				ltdu = BinFile(ltduName, True)
+			else:
+				ltdu = cdata.decompressToBin()
+
+			try:
+				self.processBin("ltdu", ltdu, 0)
+			finally:
+				ltdu.close() # unmaps the dump, Windows keeps mapped files locked
 
 			log.subLevel()
 
@@ -1062,11 +1167,11 @@ class DagorBinaryLevelData(Exportable):
 		filePath = self.filePath
 
 		fileSz = path.getsize(filePath)
-		f = open(filePath, "rb")
-
-		file = BinFile(f.read())
+		file = BinFile(filePath, True)
 
-		f.close()
+		self.__file = file
+		self.__blocks = {}
+		self.tagDirectory = {}
 		
 		log.log("Header")
 		log.addLevel()
@@ -1120,9 +1225,7 @@ class DagorBinaryLevelData(Exportable):
 
 			log.log(f"Block {i}: {name} (sz={sz} @ {ofs - 8}) magic={unpack('I', bName)[0]}={hex(unpack('I', bName)[0])}")
 			
-			dat = file.readBlock(sz - 4)
-
-			log.addLevel()
+			file.seek(sz - 4, 1) # blocks are only parsed once something asks for them, see getBlock
 
 			iName = toInt(bName)
 
@@ -1130,11 +1233,7 @@ class DagorBinaryLevelData(Exportable):
 				raise Exception(f"Tag {bName}={hex(iName)} already present in tags dict")
 			
 			self.tags[iName] = ofs
-			
-			if name == "RIGz":
-				self.processBin(name, dat, ofs)
-
-			log.subLevel()
+			self.tagDirectory[name] = (ofs, sz - 4)
 
 			if iName == TAG_END:
 				break
@@ -1439,14 +1538,13 @@ class LandClass(Exportable): # landclasses used to automatically generated plant
 		self.setFilePath(filePath)
 		self.setName(path.splitext(path.basename(filePath))[0])
 
-		f = open(filePath, "rb")
-		
-		file = BinFile(f.read()[4:])
-
-		f.close()
+		file = BinFile(filePath, True)
+		file.seek(4)
 
 		cDat = BinFile(CompressedData(file).decompress())
 
+		file.close()
+
 		self.__readFile__(cDat)
 	
 	def __loadGenLand__(self, file:BinBlock):
@@ -9,8 +9,14 @@ from util.enums import *
 from parse.datablock import *
 from parse.realres import RealResData, UnknownResData, REALRES_CLASSES_DICT
 from util.terminable import SafeRange, Pack, Terminable, FilePathable, SafeEnumerate, SafeIter
-from util.decompression import zstdDecompress
+from util.decompression import zstdDecompress, cachedDecompress, getBlockKey
 from parse.material import MaterialData, computeMaterialNames
+from util.assetindex import AssetIndex
+from collections.abc import Sequence
+import numpy as np
+
+RES_ENTRY_DTYPE = np.dtype([("classId", "<u4"), ("offset", "<u4"), ("realResId", "<u2"), ("resv", "<u2")])
+RES_DATA2_DTYPE = np.dtype([("classId", "<u4"), ("resId", "<u2"), ("realResId", "<u2"), ("pOffset", "<u4"), ("parentCnt", "<u4"), ("resv", "<u8")])
 
 
 class GameResDesc(FilePathable, Terminable):
@@ -18,10 +24,10 @@ class GameResDesc(FilePathable, Terminable):
 		super().__init__(filePath)
 
 		self.__datablock = None
+		self.__summary:dict = None
 	
 	def __getDecompressed__(self):
-		file = open(self.filePath, "rb")
-
+		file = BinFile(self.filePath, True)
 
 		if readByte(file) != 2:
 			file.close()
@@ -31,7 +37,7 @@ class GameResDesc(FilePathable, Terminable):
 		log.log("Decompressing...")
 		
 		size = readEx(3, file) # - 5
-		decompressed = BinFile(zstdDecompress(file.read(size)))
+		decompressed = BinFile(cachedDecompress(getBlockKey(file, size), zstdDecompress, file.read(size)))
 
 		# if readByte(file) != 1:
 		# 	file.close()
@@ -42,88 +48,121 @@ class GameResDesc(FilePathable, Terminable):
 
 		return decompressed
 	
-	def loadDataBlock(self):
+	def __readDataBlock__(self):
 		log.log(f"Reading GameResDesc {self.name}")
 		log.addLevel()
 
-		self.__datablock = loadDataBlock(self.__getDecompressed__())
+		datablock = loadDataBlock(self.__getDecompressed__())
 
 		log.subLevel()
+
+		return datablock
+
+	def loadDataBlock(self):
+		self.__datablock = self.__readDataBlock__()
 	
 	def getDataBlock(self):
 		return self.__datablock
+	
+	def __buildSummary__(self):
+		# model name -> (textures, {material block name: ((param name, is a texture slot, value), ...) for each material})
+		datablock = self.__datablock if self.__datablock is not None else self.__readDataBlock__()
 
-	def getModelTextures(self, model:str) -> list[str]:
-		blk = None
-		tex = None
+		log.log(f"Summarizing GameResDesc {self.name}")
+
+		summary = {}
+
+		for blk in SafeIter(self, datablock.getChildren()):
+			blk:DataBlock
+			name = blk.getName()
+
+			if name in summary: # getByName returns the first match
+				continue
 
-		try:
-			blk = self.__datablock.getByName(model)
 			tex = blk.getByName("tex")
+			matBlocks = {}
+
+			for blockName in DESC_MATERIAL_BLOCKS:
+				matB = blk.getByName(blockName)
+
+				if matB is not None:
+					matBlocks[blockName] = tuple(GameResDesc.__summarizeMaterial(matBlock) for matBlock in matB.getChildren())
+
+			summary[name] = (tuple() if tex is None else tuple(tex.getParamById(i)[1] for i in range(tex.getParamsCount())), matBlocks)
+
+		return summary
+	
+	@staticmethod
+	def __summarizeMaterial(matBlock:DataBlock):
+		params = (matBlock.getParamById(i) for i in range(matBlock.getParamsCount()))
+
+		return tuple((matBlock.getParamNameByFlags(flags), flags & 0xF000000 == 0x2000000, val) for flags, val in params)
 
-			if tex is None:
-				raise Exception
-		except Exception as er:
+	def getSummary(self) -> dict:
+		if self.__summary is not None:
+			return self.__summary
+		
+		summary = AssetIndex.loadOrBuild(self.filePath, ASSET_INDEX_DESC, self.__buildSummary__, lambda: not self.shouldTerminate)
+
+		if not self.shouldTerminate: # a summary cut short is rebuilt by the next call
+			self.__summary = summary
+		
+		return summary
+
+	def getModelTextures(self, model:str) -> list[str]:
+		desc = self.getSummary().get(model)
+
+		if desc is None:
 			return tuple()
 
-		return tuple(tex.getParamById(i)[1] for i in SafeRange(self, tex.getParamsCount()))
+		return desc[0]
 	
 	def hasName(self, model:str):
-		try:
-			if self.__datablock.getByName(model) != None:
-				return True
-		except:
-			return False
+		return model in self.getSummary()
 
-	def __exploreMaterialBlock(self, blk:DataBlock, blockName:str, tex:list[str], mats:list[MaterialData]):
-		matB = blk.getByName(blockName)
+	def __exploreMaterialBlock(self, matBlocks:dict, blockName:str, tex:list[str], mats:list[MaterialData]):
+		matB = matBlocks.get(blockName)
 
 		if matB is None:
 			log.log(f"No such block '{blockName}', skipping")
 
 			return
 		
-		for matBlock in SafeIter(self, matB.getChildren()):
-			matBlock:DataBlock
+		for k, matParams in SafeEnumerate(self, matB):
 			mat = MaterialData()
 
-
-			log.log(f"{matBlock}")
+			log.log(f"{blockName} #{k}")
 			log.addLevel()
 
-			for i in SafeRange(self, matBlock.getParamsCount()):
-				flags, params = matBlock.getParamById(i)
-				blockName = matBlock.getParamNameByFlags(flags)
-				blockType = flags & 0xF000000
-
-				if blockType == 0x2000000:
-					mat.addTexSlot(blockName, tex[params])
+			for i, (paramName, isTex, params) in SafeEnumerate(self, matParams):
+				if isTex:
+					mat.addTexSlot(paramName, tex[params])
 
-					log.log(f"{i}:{blockName}:{tex[params]}")
+					log.log(f"{i}:{paramName}:{tex[params]}")
 				else: # TODO: handle unknown block types
-					setattr(mat, blockName, params)
+					setattr(mat, paramName, params)
 
-					log.log(f"{i}:{blockName}:{params}")
+					log.log(f"{i}:{paramName}:{params}")
 
 			log.subLevel()
 
 			mats.append(mat)
 
 	def __getModelMaterials(self, model:str, blockNames:tuple[str]):
-		tex = self.getModelTextures(model)
+		desc = self.getSummary().get(model)
 
-		if tex is None:
-			raise Exception
+		if desc is None:
+			raise Exception(f"No such model {model} in {self.name}")
 		
+		tex, matBlocks = desc
+
 		log.log(f"Pulling materials from GameResDesc for model {model}")
 		log.addLevel()
-
-		blk = self.__datablock.getByName(model)
 		
 		mats:list[MaterialData] = []
 
 		for name in SafeIter(self, blockNames):
-			self.__exploreMaterialBlock(blk, name, tex, mats)
+			self.__exploreMaterialBlock(matBlocks, name, tex, mats)
 
 		computeMaterialNames(mats, self)
 
@@ -156,59 +195,40 @@ class GameResourcePack(Pack): # may need cleanup / TODO: rewrite like DXP2
 	
 
 	class RealResEntry: # TODO: parents do not work
+		# one row of the pack's entry table, only created on request
 		def __repr__(self):
 			return f"<RealResEntry [{hex(self.__classId)}] #{self.__realResId} p={self.__parentCnt} @ {self.__offset}:{self.__name}>"
 		
-		def __init__(self, grp, idx:int, name:str, classId:int, offset:int, realResId:int, _resv:int):
+		def __init__(self, grp, name:str, classId:int, offset:int, realResId:int, size:int, parentCnt:int, pOffset:int):
 			self.__grp:GameResourcePack = grp
 			self.__classId = classId
 			self.__offset = offset
 			self.__realResId = realResId
-			self.__resv = _resv
+			self.__size = size
 			self.__name = name
 
-			self.__parentCnt = 0
-			self.__pOffset = 0
-			self.__parentRes:list[GameResourcePack.RealResEntry] = []
-
-			if (idx != realResId):
-				log.log(f"{self}: inconsistant idx={idx} realResId={realResId}", LOG_ERROR)
-
-			# print(idx, hex(classId), offset, realResId, _resv)
+			self.__parentCnt = parentCnt
+			self.__pOffset = pOffset
 		
 		def getParentOffset(self):
 			return self.__pOffset
 		
 		def getParentCnt(self):
 			return self.__parentCnt
-		
-		def appendParentRes(self, parent):
-			self.__parentRes.append(parent)
-		
-		def getParentRes(self):
-			return self.__parentRes
 
 		def getRealResData(self):
 			log.log(f"Pulling {self.__name} from {self.__grp.name}")
 			log.addLevel()
-			resCnt = self.__grp.getRealResEntryCnt()
-
-			size = 0
-
-			if self.__realResId + 1 >= resCnt:
-				size = self.__grp.size - self.__offset
-			else:
-				size = self.__grp.getRealResEntry(self.__realResId + 1).__offset - self.__offset
 			
 			resData:RealResData = None
 
 			if self.__classId in REALRES_CLASSES_DICT:
 				resData = REALRES_CLASSES_DICT[self.__classId](self.__grp.filePath,
 						   name = self.__name,
-						   size = size, 
+						   size = self.__size, 
 						   offset = self.__offset)
 			else:
-				resData = UnknownResData(self.__grp.filePath, self.__name, size, self.__offset, self.__classId)
+				resData = UnknownResData(self.__grp.filePath, self.__name, self.__size, self.__offset, self.__classId)
 				log.log(f"Unknown resdata class {hex(self.__classId)}", LOG_WARN)
 
 			resData.setCachedBinFile(self.__grp.cachedBinFile)
@@ -219,13 +239,26 @@ class GameResourcePack(Pack): # may need cleanup / TODO: rewrite like DXP2
 		
 		def getName(self):
 			return self.__name
-
-		def appendData(self, classId:int, resId:int, resDataId:int, pOffset:int, parentCnt:int, l:int):
-			# if resId != resDataId:
-			# 	log.log(f"{self}: inconsistant resId={resId} resDataId={resDataId}", LOG_ERROR)
+	
+	class PackedFiles(Sequence):
+		# RealResData of every entry, each one is only built when it is first accessed
+		def __init__(self, grp):
+			self.__grp:GameResourcePack = grp
+		
+		def __len__(self):
+			return self.__grp.getRealResEntryCnt()
+		
+		def __getitem__(self, idx):
+			if isinstance(idx, slice):
+				return tuple(self.__grp.getRealResource(i) for i in range(*idx.indices(len(self))))
 			
-			self.__parentCnt = parentCnt
-			self.__pOffset = pOffset
+			if idx < 0:
+				idx += len(self)
+			
+			if idx < 0 or idx >= len(self):
+				raise IndexError(idx)
+			
+			return self.__grp.getRealResource(idx)
 
 		
 	def __init__(self, filePath:str, name:str = None):
@@ -241,6 +274,10 @@ class GameResourcePack(Pack): # may need cleanup / TODO: rewrite like DXP2
 		return f"<{self.name}.grp\tnmo={self.__nameMapOffset}\tnmn={self.__nameMapNum}\treo={self.__realResEntriesOffset}\trd2={self.__resData2}\trd2n={self.__resData2Num}>"
 
 	def __readFile__(self):
+		self.__loadTable__(AssetIndex.loadOrBuild(self.filePath, ASSET_INDEX_GRP, self.__readTable__, lambda: not self.shouldTerminate))
+
+	def __readTable__(self):
+		# everything __loadTable__ needs, kept as plain values so that it can go in the asset index
 		f = open(self.filePath, "rb")
 		f.seek(0x8, 1)
 		file = BinFile(f.read(readInt(f) + 0x4))
@@ -251,53 +288,85 @@ class GameResourcePack(Pack): # may need cleanup / TODO: rewrite like DXP2
 		# file.seek(0xC, 1)
 		
 		dataSize = readInt(file) + 0x10
-		self._setSize(dataSize)
 
 		nameMapOffset = readInt(file) - OFS
 		nameMapNum = readInt(file)
 
-		self.__nameMapOffset = nameMapOffset
-		self.__nameMapNum = nameMapNum
-
 		file.seek(8, 1)
 
 		realResEntriesOffset = readInt(file) - OFS
 		realResNum = readInt(file)
 
-		self.__realResEntriesOffset = realResEntriesOffset
-
 		file.seek(8, 1)
 
 		resData2 = readInt(file) - OFS
 		resData2Num = readInt(file)
 
-		self.__resData2 = resData2
-		self.__resData2Num = resData2Num
-
 		file.seek(8, 1)
 		
-		nameMap = readNameMap(file, nameMapNum, nameMapOffset, 0x40, self)
-		
-		log.addLevel()
-		
-		self.__resEntriesOfs = file.tell()
-
-		realResEntries = tuple(GameResourcePack.RealResEntry(self, i, nameMap[i],
-								readInt(file), # classId
-								readInt(file), # offset
-								readShort(file), # realResId
-								readShort(file)) # _resv
-								for i in SafeRange(self, realResNum))
-		
+		nameMap = tuple(readNameMap(file, nameMapNum, nameMapOffset, 0x40, self))
+
+		resEntriesOfs = file.tell()
+		realResEntries = bytes(file.read(realResNum * 0xC))
+
 		# file.seek(0x10 - file.tell() % 0x10, 1)
 
-		for i in SafeRange(self, resData2Num):
-			realResEntries[i].appendData(readInt(file), # classId
-								readShort(file), # resId
-								readShort(file), # realResId
-								readInt(file),
-								readInt(file),
-								readLong(file))
+		resData2Entries = bytes(file.read(resData2Num * 0x18))
+
+		return (dataSize,
+			nameMapOffset,
+			nameMapNum,
+			realResEntriesOffset,
+			resData2,
+			resData2Num,
+			resEntriesOfs,
+			nameMap,
+			realResEntries,
+			resData2Entries)
+
+	def __loadTable__(self, table:tuple):
+		(dataSize,
+		self.__nameMapOffset,
+		self.__nameMapNum,
+		self.__realResEntriesOffset,
+		self.__resData2,
+		self.__resData2Num,
+		self.__resEntriesOfs,
+		nameMap,
+		realResEntries,
+		resData2Entries) = table
+
+		self._setSize(dataSize)
+
+		entries = np.frombuffer(realResEntries, RES_ENTRY_DTYPE)
+		resData2 = np.frombuffer(resData2Entries, RES_DATA2_DTYPE)[:len(entries)]
+		cnt = len(entries)
+
+		offsets = entries["offset"].astype(np.int64)
+		nextIds = entries["realResId"].astype(np.int64) + 1
+
+		self.__classIds = entries["classId"]
+		self.__offsets = entries["offset"]
+		self.__realResIds = entries["realResId"]
+		self.__sizes = np.where(nextIds < cnt, offsets[np.minimum(nextIds, cnt - 1)], dataSize) - offsets # up to the entry after realResId
+
+		self.__parentCnts = np.zeros(cnt, np.uint32)
+		self.__parentCnts[:len(resData2)] = resData2["parentCnt"]
+		self.__pOffsets = np.zeros(cnt, np.uint32)
+		self.__pOffsets[:len(resData2)] = resData2["pOffset"]
+
+		names = nameMap[:cnt]
+
+		self.__names = "\x00".join(names)
+		self.__nameOffsets = np.cumsum([0] + [len(v) + 1 for v in names], dtype = np.int64)
+		self.__nameIndex:dict[str, int] = None
+
+		self.__resData:list[RealResData] = [None] * cnt
+
+		log.addLevel()
+
+		for i in np.flatnonzero(self.__realResIds != np.arange(cnt)).tolist():
+			log.log(f"{self.getRealResEntry(i)}: inconsistant idx={i} realResId={self.__realResIds[i]}", LOG_ERROR)
 
 		# for resEntry in SafeIter(self, realResEntries):
 			# file.seek(resEntry.getParentOffset(), 0)
@@ -311,32 +380,52 @@ class GameResourcePack(Pack): # may need cleanup / TODO: rewrite like DXP2
 			# 		log.log(f"{e}: {i=} {resEntryIdx=}", LOG_ERROR)
 
 		log.subLevel()
-
-		# file.close()
-
-		self.__realResEntries = realResEntries
-
 	
+	def getRealResName(self, resId:int):
+		return self.__names[self.__nameOffsets[resId]:self.__nameOffsets[resId + 1] - 1]
+
 	def getRealResEntry(self, resId:int):
-		return self.__realResEntries[resId]
+		return GameResourcePack.RealResEntry(self,
+					   self.getRealResName(resId),
+					   int(self.__classIds[resId]),
+					   int(self.__offsets[resId]),
+					   int(self.__realResIds[resId]),
+					   int(self.__sizes[resId]),
+					   int(self.__parentCnts[resId]),
+					   int(self.__pOffsets[resId]))
 	
 	def getRealResEntryCnt(self):
-		return len(self.__realResEntries)
+		return len(self.__resData)
 	
 	def getRealResource(self, realResId:int):
-		assert realResId >= 0 and realResId <= len(self.__realResEntries)
+		assert realResId >= 0 and realResId < len(self.__resData)
+
+		resData = self.__resData[realResId]
+
+		if resData is None:
+			resData = self.__resData[realResId] = self.getRealResEntry(realResId).getRealResData()
 
-		return self.__realResEntries[realResId].getRealResData()
+		return resData
 	
 	def getPackedFiles(self):
-		return tuple(self.getRealResource(i) for i in SafeRange(self, len(self.__realResEntries)))
+		return GameResourcePack.PackedFiles(self)
 
 	def getRealResId(self, name:str):
-		for k, v in SafeEnumerate(self, self.__realResEntries):
-			if v.getName() == name:
-				return k
+		if self.__nameIndex is None:
+			index = {}
 
-		raise ValueError(f"No such resource {name} in gameres {self}")
+			if len(self.__resData) > 0:
+				for k, v in enumerate(self.__names.split("\x00")):
+					index.setdefault(v, k)
+			
+			self.__nameIndex = index
+		
+		realResId = self.__nameIndex.get(name)
+
+		if realResId is None:
+			raise ValueError(f"No such resource {name} in gameres {self}")
+		
+		return realResId
 
 	def getResourceByName(self, name:str):
 		return self.getRealResource(self.getRealResId(name))
@@ -6,16 +6,18 @@ sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 import util.log as log
 from util.fileread import *
 from util.terminable import Packed, Pack, SafeIter, SafeRange, SafeEnumerate, SafeReversed, Terminable
-from util.decompression import zstdDecompress, oodleDecompress, zlibDecompress, lzmaDecompress
+from util.decompression import cachedDecompress, getBlockKey, getDDSxCodec, copyInto, DECOMPRESSED_CACHE, DDSX_METHODS
 from util.enums import *
 from util.assetcacher import AssetCacher
+from util.assetindex import AssetIndex
+from util.texturepipeline import TexturePipeline
 from struct import pack_into as packInto
 from struct import pack
-from ctypes import create_string_buffer
 from PIL import Image
 from PIL.ImageChops import invert
 
 DDSX_HEADER_SIZE = 0x20
+DDSX_HEADER_FORMAT = "<4s4sIHHBBHHBBII"
 
 class DDSx(Packed):
 	class Header:
@@ -25,33 +27,45 @@ class DDSx(Packed):
 		def getFormattedData(self):
 			return f"{self.d3dformat} {self.w}x{self.h}"
 		
-		def __init__(self, file:BinBlock):
-			self.label = file.read(4)
-
-			self.d3dformat = file.read(4)
-			self.flags = readEx(3, file)
-			self.cMethod = readByte(file)
-			self.h = readShort(file)
-			self.w = readShort(file)
-
-			self.levels = readByte(file)
-			self.hqPartLevels = readByte(file)
-
-			self.depth = readShort(file)
-			self.bitsPerPixel = readShort(file)
-
-			b = readByte(file)
-
-			self.lQmip = b >> 4
-			self.mQmip = b & 0x0F
-
-			b = readByte(file)
-
-			self.dxtShift = b >> 4
-			self.uQmip = b & 0x0F
-
-			self.memSz = readInt(file)
-			self.packedSz = readInt(file)
+		def __init__(self, file:BinBlock = None):
+			if file is not None:
+				self.__loadValues(getStruct(DDSX_HEADER_FORMAT).unpack(file.read(DDSX_HEADER_SIZE)))
+		
+		def __loadValues(self, values:tuple):
+			(self.label,
+			self.d3dformat,
+			flags,
+			self.h,
+			self.w,
+			self.levels,
+			self.hqPartLevels,
+			self.depth,
+			self.bitsPerPixel,
+			lmQmip,
+			dxtShiftUQmip,
+			self.memSz,
+			self.packedSz) = values
+
+			self.flags = flags & 0xFFFFFF
+			self.cMethod = flags >> 24
+
+			self.lQmip = lmQmip >> 4
+			self.mQmip = lmQmip & 0x0F
+
+			self.dxtShift = dxtShiftUQmip >> 4
+			self.uQmip = dxtShiftUQmip & 0x0F
+		
+		@classmethod
+		def unpackAll(cls, data:bytes):
+			# every header of a contiguous header table in one pass
+			headers = []
+
+			for values in getStruct(DDSX_HEADER_FORMAT).iter_unpack(data):
+				header = cls()
+				header.__loadValues(values)
+				headers.append(header)
+			
+			return headers
 
 		def getBin(self):
 			return pack("4s4sIHHBBHHBBII", 	self.label, 
@@ -177,7 +191,7 @@ class DDSx(Packed):
 		# 	self.__loadSingleFile__()
 		# else:
 
-		self._setName(self.name.split('*')[0].split("$")[0])
+		self._setName(DDSx.normalizeName(self.name))
 
 		if dataOffset == DDSX_HEADER_SIZE:
 			self.__singleFile = True
@@ -203,21 +217,46 @@ class DDSx(Packed):
 
 		log.log(f"Decompressing {self.__header.memSz}b using {cMethod=}")
 
-		if cMethod == 0x20:
-			data = zstdDecompress(data)
-		elif cMethod == 0x60:
-			data = oodleDecompress(data, maxOriginalSize = self.__header.memSz)
-		elif cMethod == 0x80:
-			data = zlibDecompress(data)
-		elif cMethod == 0x40:
-			data = lzmaDecompress(data)
+		if cMethod in DDSX_METHODS:
+			data = getDDSxCodec(cMethod).decompress(data, self.__header.memSz)
 		
 		return data
 
 	
+	def decompressInto(self, dst):
+		# decompresses straight into the writable buffer dst, returns the amount of bytes written
+		file = self.getBin()
+		key = getBlockKey(file, file.getSize())
+		data = DECOMPRESSED_CACHE.get(key) if key is not None else None
+
+		if data is not None:
+			return copyInto(data, dst)
+
+		cMethod = self.__header.cMethod
+		data = file.read()
+
+		log.log(f"Decompressing {self.__header.memSz}b into place using {cMethod=}")
+
+		if cMethod not in DDSX_METHODS:
+			return copyInto(data, dst)
+		
+		size = getDDSxCodec(cMethod).decompressInto(data, dst)
+
+		if key is not None: # textures shared by several models are only decompressed once, like getData
+			DECOMPRESSED_CACHE.put(key, bytes(memoryview(dst)[:size]), size)
+
+		return size
+
+	@staticmethod
+	def normalizeName(name:str):
+		return name.split("*")[0].split("$")[0]
+	
 	def getPixelCnt(self):
 		return self.__header.w * self.__header.h
 	
+	def getMemSize(self):
+		return self.__header.memSz
+	
 	def getMipSize(self, width:int, height:int, dxtVersion:bytes):
 		dxtSize = max(1, (width + 3) // 4) * max(1, (height + 3) // 4)
 
@@ -231,15 +270,16 @@ class DDSx(Packed):
 			return dxtSize * 8
 
 	def getData(self):
-		return self.__decompress__(self.getBin().read())
+		file = self.getBin()
+
+		return cachedDecompress(getBlockKey(file, file.getSize()), self.__decompress__, file.read())
 	
 	def save(self, output:str = getcwd()):
 		self._save(output, self.__header.getBin() + self.getBin().read())
 
 	def getDDS(self):
+		# runs on TexturePipeline workers, so it logs without touching the level
 		log.log(f"Converting {self.name} to DDS")
-		log.addLevel()
-
 
 		d3dformat = self.__header.d3dformat
 		w, h = self.__header.w, self.__header.h
@@ -248,11 +288,15 @@ class DDSx(Packed):
 		log.log(f"D3D Format    =	{d3dformat}")
 		log.log(f"Resolution    =	{w}x{h}")
 
-		data = self.getData()
-
+		isDX10 = d3dformat in self.__DX10_FORMATS
+		headerSz = 0x94 if isDX10 else 0x80
 
+		# the payload is decompressed right behind the DDS header of the final buffer
 		if self.__header.flags & 0x40000:
 			log.log("Found reversed mip order")
+
+			src = bytearray(self.__header.memSz)
+			src = memoryview(src)[:self.decompressInto(src)]
 			
 			pos = 0
 			images = []
@@ -263,42 +307,44 @@ class DDSx(Packed):
 				height = h // (2 ** level)
 
 				size = self.getMipSize(width, height, d3dformat)
-				images.append(data[pos:pos + size])
+				images.append(src[pos:pos + size])
 				pos += size
 
-			data = bytearray()
+			data = bytearray(headerSz + sum(len(image) for image in images))
+			pos = headerSz
 
 			for image in SafeReversed(self, images):
-				data.extend(image)
+				data[pos:pos + len(image)] = image
+				pos += len(image)
+		else:
+			data = bytearray(headerSz + self.__header.memSz)
+			view = memoryview(data)
+			size = self.decompressInto(view[headerSz:])
+
+			view.release()
+
+			del data[headerSz + size:]
 		
 		
-		if d3dformat in self.__DX10_FORMATS:
+		if isDX10:
 			log.log("Found DX10 texture")
 
-			ddsData = create_string_buffer(0x94)
-
-			packInto('148B', ddsData, 0, *self.__DDS_2_HEADER)
-			packInto('I', ddsData, 0xc, w)
-			packInto('I', ddsData, 0x10, h)
-			packInto('I', ddsData, 0x14, self.__header.memSz)
-			packInto('B', ddsData, 0x1c, self.__header.levels)
-			packInto('4s', ddsData, 0x54, b"DX10")
+			packInto('148B', data, 0, *self.__DDS_2_HEADER)
+			packInto('I', data, 0xc, w)
+			packInto('I', data, 0x10, h)
+			packInto('I', data, 0x14, self.__header.memSz)
+			packInto('B', data, 0x1c, self.__header.levels)
+			packInto('4s', data, 0x54, b"DX10")
 		else:
-			ddsData = create_string_buffer(0x80)
-
-			packInto('128B', ddsData, 0, *self.__DDS_HEADER)
-			packInto('I', ddsData, 0xc, w)
-			packInto('I', ddsData, 0x10, h)
-			packInto('I', ddsData, 0x14, self.__header.memSz)
-			packInto('B', ddsData, 0x1c, self.__header.levels)
-			packInto('4s', ddsData, 0x54, d3dformat)
-		
-		data = ddsData.raw + data
+			packInto('128B', data, 0, *self.__DDS_HEADER)
+			packInto('I', data, 0xc, w)
+			packInto('I', data, 0x10, h)
+			packInto('I', data, 0x14, self.__header.memSz)
+			packInto('B', data, 0x1c, self.__header.levels)
+			packInto('4s', data, 0x54, d3dformat)
 
 		log.log(f"Done: final size = {len(data)}")
 
-		log.subLevel()
-
 		return data
 	
 	@property
@@ -330,15 +376,15 @@ class DDSx(Packed):
 	# def name(self):
 	# 	return self.fileName
 	
-	def exportDDS(self, output:str = getcwd()):
-		fileName = f"{self.name}.dds"
-
-		output = path.normpath(f"{output}\\{fileName}")
+	def buildDDS(self, output:str = getcwd()):
+		# (output path, data) for exportDDS, safe to call from several threads at once
+		return path.normpath(f"{output}\\{self.name}.dds"), self.getDDS()
 
-		log.log(f"Saving {fileName}")
+	def exportDDS(self, output:str = getcwd()):
+		log.log(f"Saving {self.name}.dds")
 		log.addLevel()
 
-		binData = self.getDDS()
+		output, binData = self.buildDDS(output)
 
 		file = open(output, "wb")
 
@@ -374,6 +420,24 @@ class DDSxTexturePack2(Pack): # TODO: Add logs
 		self.__pulledAll = False
 	
 	def __readFile__(self):
+		self.__loadTable__(AssetIndex.loadOrBuild(self.filePath, ASSET_INDEX_DXP, self.__buildTable__, lambda: not self.shouldTerminate))
+	
+	def __buildTable__(self):
+		table = self.__readTable__()
+
+		if not self.shouldTerminate:
+			nameMap, headers, offsets = table
+			records = []
+
+			for i, header in enumerate(DDSx.Header.unpackAll(headers)):
+				if header.packedSz != 0:
+					records.append((DDSx.normalizeName(nameMap[i]), i, offsets[i], headers[i * DDSX_HEADER_SIZE:(i + 1) * DDSX_HEADER_SIZE]))
+			
+			AssetIndex.registerTextures(self.filePath, records)
+
+		return table
+	
+	def __readTable__(self):
 		# log.addLevel()
 
 		f = open(self.filePath, "rb")
@@ -388,51 +452,56 @@ class DDSxTexturePack2(Pack): # TODO: Add logs
 
 		file.seek(8, 1)
 
-		self.__ddsxHeadersOfs = readInt(file)
+		ddsxHeadersOfs = readInt(file)
 		# self.__ddsxHeaders:list[DDSx.Header] = [None for _ in SafeRange(self, readInt(file))]
 		if readInt(file) != fileCnt:
 			raise Exception("ddsxHeader cnt != fileCnt")
 
 		file.seek(8, 1)
 
-		self.__ddsxRecordsOfs = readInt(file) + 0xC
+		ddsxRecordsOfs = readInt(file) + 0xC
 		# self.__ddsxRecords:list = [None for _ in SafeRange(self, readInt(file))]
 		if readInt(file) != fileCnt:
 			raise Exception("ddsxRecord cnt != fileCnt")
 
 		file.seek(0x10, 1)
 
-		self.__nameMap = readNameMap(file, nameMapIndiciesCnt, nameMapIndiciesOfs, 0x38, self, True)
+		nameMap = tuple(readNameMap(file, nameMapIndiciesCnt, nameMapIndiciesOfs, 0x38, self, True))
+
+		file.seek(ddsxHeadersOfs, 0)
+		headers = bytes(file.read(fileCnt * DDSX_HEADER_SIZE))
+
+		file.seek(ddsxRecordsOfs, 0)
+		offsets = tuple(v[0] for v in file.readStructArray("<I20x", fileCnt)) # 0x18
+		
+		file.close()
+
+		return nameMap, headers, offsets
+	
+	def __loadTable__(self, table:tuple):
+		self.__nameMap, headers, offsets = table
 
 		self.__files:list[DDSx] = []
+		self.__filesByName:dict[str, DDSx] = {}
 
-		for i in SafeRange(self, fileCnt):
-			ddsx = self.__readDDSx__(file, i)
+		for i, header in zip(SafeRange(self, len(offsets)), DDSx.Header.unpackAll(headers)):
+			ddsx = self.__readDDSx__(i, header, offsets[i])
 
 			if ddsx is not None:
 				self.__files.append(ddsx)
-		
-		file.close()
+				self.__filesByName.setdefault(ddsx.name, ddsx)
 	
-	def __readDDSx__(self, file:BinFile, id:int):
+	def __readDDSx__(self, id:int, header:DDSx.Header, offset:int):
 		name = self.__nameMap[id]
 
 		log.log(f"Pulling {id}:{name} from {self.name}.dxp.bin")
 		log.addLevel()
 
-		file.seek(self.__ddsxHeadersOfs + id * DDSX_HEADER_SIZE, 0)
-
-		header = DDSx.Header(BinFile(file.read(DDSX_HEADER_SIZE)))
-
 		ddsx = None
 
 		if header.packedSz == 0:
 			log.log(f"Ignoring null sized DDSx")
 		else:
-			file.seek(self.__ddsxRecordsOfs + id * 0x18, 0) # 0x18
-
-			offset = readInt(file)
-			
 			ddsx = DDSx(self.filePath, name, header.memSz, offset, header)
 
 		log.subLevel()
@@ -445,11 +514,7 @@ class DDSxTexturePack2(Pack): # TODO: Add logs
 		return self.__files[id]
 	
 	def getDDSxByName(self, name:str):
-		for k, v in SafeRange(self, self.__nameMap):
-			if v == name:
-				return self.getDDSxById(k)
-				
-		return None
+		return self.__filesByName.get(DDSx.normalizeName(name))
 	
 	def getPackedFiles(self) -> list[DDSx, False]:
 		return self.__files
@@ -481,6 +546,22 @@ def addComp(list:list[str], comp:str):
 	if comp is not None:
 		list.append(ftm(comp))
 
+def findDDSx(name:str) -> list[DDSx]:
+	# mounted textures first, then whatever the asset index knows about packs that were never mounted
+	ddsx = AssetCacher.getCachedAsset(DDSx, name)
+
+	if ddsx:
+		return ddsx
+	
+	ddsx = []
+
+	for filePath, record, offset, header in AssetIndex.findTextures(DDSx.normalizeName(name)):
+		header = DDSx.Header.unpackAll(header)[0]
+
+		ddsx.append(DDSx(filePath, name, header.memSz, offset, header))
+	
+	return ddsx
+
 def getBestTex(self:Terminable, ddsx:list[DDSx]):
 	best = ddsx[0]
 	
@@ -535,7 +616,7 @@ class TexturePathDict:
 			self.__customPath = f"models/{customPath}"
 
 	def getTexPath(self, texName:str):
-		cachedDDSx = AssetCacher.getCachedAsset(DDSx, texName)
+		cachedDDSx = findDDSx(texName)
 
 		if cachedDDSx:
 			cachedDDSx:DDSx = cachedDDSx[0]
@@ -573,6 +654,39 @@ class TexturePathDict:
 		return self.__customPath
 
 
+def makeTextureFolder(output:str):
+	outpath = path.join(output, "textures")
+
+	if not path.exists(outpath):
+		makedirs(outpath, exist_ok = True)
+
+def exportTextureBatch(parent:Terminable, textures:list[tuple], output:str, forceConvert:bool = False, texturePaths:TexturePathDict = None):
+	# textures are (material, texture, texN), they are decompressed and converted in parallel by a TexturePipeline
+	makeTextureFolder(output)
+
+	jobs = []
+
+	for mat, texture, texN in SafeIter(parent, textures):
+		mat:MaterialData
+		ddsx = mat.findTexture(texture)
+
+		if ddsx is not None:
+			jobs.append((mat.buildTexture, (texture, ddsx, output, forceConvert, texturePaths, texN), ddsx.getMemSize()))
+	
+	if len(jobs) == 0 or parent.shouldTerminate:
+		return
+	
+	pipeline = TexturePipeline()
+
+	parent.setSubTask(pipeline)
+
+	for idx, error in pipeline.run(jobs):
+		if error is not None:
+			log.log(f"Couldn't export {jobs[idx][1][0]}", LOG_ERROR)
+			print(error)
+	
+	parent.clearSubTask()
+
 class MaterialData(Terminable):
 	def __repr__(self):
 		return f"<MaterialData {self.getName()}>"
@@ -721,29 +835,39 @@ class MaterialData(Terminable):
 		
 		return data, newName
 	
-	def exportTexture(self, texture:str, output:str = getcwd(), forceConvert:bool = False, texturePaths:TexturePathDict = None, texN:str = None):
-		outpath = path.join(output, "textures")
-
-		if not path.exists(outpath):
-			mkdir(outpath)
-			
-		
+	def findTexture(self, texture:str) -> DDSx:
 		name = texture.split("*")[0]
 
-		ddsx:list[DDSx] = AssetCacher.getCachedAsset(DDSx, name)
+		ddsx:list[DDSx] = findDDSx(name)
 
 		if not ddsx:
 			log.log(f"{name} not found")
 			
-			return
+			return None
 		
-		data = getBestTex(self, ddsx).getDDS()
+		return getBestTex(self, ddsx)
+	
+	def buildTexture(self, texture:str, ddsx:DDSx, output:str, forceConvert:bool = False, texturePaths:TexturePathDict = None, texN:str = None):
+		# (output path, data) of a texture found by findTexture, safe to call from several threads at once
+		name = texture.split("*")[0]
+
+		data = ddsx.getDDS()
 		data, texN = self.convertTex(texture, data, texturePaths, forceConvert, texN)
 
 		if texN is not None:
 			name = texN
 
-		output = path.join(outpath, f"{name}.dds")
+		return path.join(output, "textures", f"{name}.dds"), data
+	
+	def exportTexture(self, texture:str, output:str = getcwd(), forceConvert:bool = False, texturePaths:TexturePathDict = None, texN:str = None):
+		makeTextureFolder(output)
+		
+		ddsx = self.findTexture(texture)
+
+		if ddsx is None:
+			return
+		
+		output, data = self.buildTexture(texture, ddsx, output, forceConvert, texturePaths, texN)
 
 		file = open(output, "wb")
 		file.write(data)
@@ -982,18 +1106,20 @@ class MaterialTemplateLibrary(Terminable):
 
 			return formatted
 
-		def __exportDiffuse__(self, outpath:str, forceConvert:bool):
-			self.material.exportTexture(self.material.diffuse, outpath, forceConvert = forceConvert)
-		
-		def __exportNormal__(self, outpath:str, forceConvert:bool):
-			self.material.exportTexture(self.material.normal, outpath, forceConvert = forceConvert)
+		def getTextures(self):
+			textures = []
 
-		def exportTextures(self, outpath:str = getcwd(), forceConvert:bool = False):
 			if "map_Kd" in self.params:
-				self.__exportDiffuse__(outpath, forceConvert)
+				textures.append((self.material, self.material.diffuse, None))
 			
 			if "map_bump" in self.params:
-				self.__exportNormal__(outpath, forceConvert)
+				textures.append((self.material, self.material.normal, None))
+			
+			return textures
+
+		def exportTextures(self, outpath:str = getcwd(), forceConvert:bool = False):
+			for mat, texture, texN in self.getTextures():
+				mat.exportTexture(texture, outpath, forceConvert = forceConvert)
 			
 
 	def __init__(self, materials:list[MaterialData]):
@@ -1011,15 +1137,14 @@ class MaterialTemplateLibrary(Terminable):
 		log.log("Exporting MTL textures")
 		log.addLevel()
 
+		textures = []
+
 		for mat in SafeIter(self, self.__mats):
 			mat:MaterialTemplateLibrary.Material
 
-			log.log(f"Exporting textures from {mat.material.getName()}")
-			log.addLevel()
-
-			mat.exportTextures(outpath, forceConvert)
-
-			log.subLevel()
+			textures.extend(mat.getTextures())
+		
+		exportTextureBatch(self, textures, outpath, forceConvert)
 		
 		log.subLevel()
 
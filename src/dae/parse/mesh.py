@@ -1,15 +1,19 @@
 import sys
-from os import path, getcwd
+from os import path, getcwd, remove
 
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
 import util.log as log
 from struct import unpack
+from io import StringIO
 from util.fileread import *
 from util.terminable import SafeRange, Terminable, FilePathable, SafeIter, SafeEnumerate
 from util.enums import *
 from parse.material import MaterialData
+from util.lrucache import LRUCache
 from abc import ABC, abstractmethod
+from itertools import accumulate
+import numpy as np
 
 
 class ShaderMesh(Terminable):
@@ -83,6 +87,53 @@ class InstShaderMeshResource(Terminable):
 		self.clearSubTask()
 	
 
+INDEX_DECODE_CHUNK = 0x30000 # indices decoded between two termination checks, multiple of 3
+
+def decodeIndexSequence(data:bytes, parent:Terminable = None) -> np.ndarray:
+	# meshopt-style index stream: LEB128 values, bit 0 selects one of two delta channels, bit 1 is the zigzag sign
+	encoded = np.frombuffer(data, np.uint8)
+	ends = np.flatnonzero(encoded < 0x80) # last byte of every value
+
+	cnt = len(ends) - len(ends) % 3
+	buffer = [0, 0]
+	chunks:list[np.ndarray] = []
+
+	for chunkStart in range(0, cnt, INDEX_DECODE_CHUNK):
+		if parent is not None and parent.shouldTerminate:
+			break
+
+		chunkEnds = ends[chunkStart:min(chunkStart + INDEX_DECODE_CHUNK, cnt)]
+		ofs = 0 if chunkStart == 0 else ends[chunkStart - 1] + 1
+
+		starts = np.empty_like(chunkEnds)
+		starts[0] = ofs
+		starts[1:] = chunkEnds[:-1] + 1
+
+		lengths = chunkEnds - starts + 1
+		shifts = (np.arange(ofs, chunkEnds[-1] + 1) - np.repeat(starts, lengths)) * 7
+
+		groups = (encoded[ofs:chunkEnds[-1] + 1] & 0x7F).astype(np.int64) << shifts
+		decoded = np.add.reduceat(groups, starts - ofs)
+
+		deltas = (decoded >> 2) ^ -((decoded >> 1) & 1)
+		indices = np.empty_like(deltas)
+
+		for channel in range(2):
+			mask = (decoded & 1) == channel
+			channelIndices = np.cumsum(deltas[mask]) + buffer[channel]
+
+			if len(channelIndices) > 0:
+				buffer[channel] = int(channelIndices[-1])
+
+			indices[mask] = channelIndices
+		
+		chunks.append(indices.reshape(-1, 3)[:, (0, 2, 1)]) # reversed order somehow fixes normals???
+	
+	if len(chunks) == 0:
+		return np.empty((0, 3), np.uint32)
+	
+	return np.concatenate(chunks).astype(np.uint32)
+
 class MatVData(Terminable, FilePathable): # stores material and vertex data :D	
 	def __init__(self, 
 	      		file:BinFile, 
@@ -101,6 +152,7 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 		self.__textures = textures
 
 		self.__dataComputed = False
+		self.__vdCache = LRUCache(MVD_VDATA_CACHE_SIZE)
 
 	def __repr__(self):
 		return f"<MVD {self.name} texCnt={self.__texCnt} matCnt={self.__matCnt} computed={self.__dataComputed}>"
@@ -336,6 +388,7 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 		self.__gvdata = tuple(self.GlobalVertexData(file.readBlock(0x20), ofs, i, self.__flag) for i in SafeRange(self, cnt))
 
 		self.__vdStartOfs = ofs + cnt * 0x20
+		self.__vdOffsets = tuple(accumulate((gvData.getFullVertexDataSz() for gvData in self.__gvdata), initial = self.__vdStartOfs))
 
 		log.subLevel()
 
@@ -348,126 +401,13 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 	#
 	
 	class VertexData(Terminable):
-		class __decodeIndexSequence__(): # i haven't cleaned this up yet and i don't think i ever will, who cares anyway
-			class __byteArrayGen__():
-				def __init__(self, parent:Terminable, data:bytes, offset:int, size:int):
-					self.parent = parent
-					self.data = data
-					self.offset = offset
-					self.size = size
-					self.done = False
-
-				def __iter__(self):
-					return self
-
-				def __next__(self):
-					if self.parent.shouldTerminate:
-						raise StopIteration()
-					else:
-						return self.next()
-
-				def next(self):
-					if not self.done and self.offset < self.size:
-						b = ord(self.data[self.offset:self.offset + 1])
-
-						self.offset += 1
-						self.done = (b & 0x80) == 0
-
-						return b
-					else:
-						raise StopIteration()
-
-			def __init__(self, data:bytes, size:int, mvd):
-				self.data = data
-				self.size = size
-				self.offset = 0
-				self.buffer = [0, 0]
-				self.count = 0
-				# self.lastCur = None
-				self.fucking = False
-				self.mvd:MatVData = mvd
-
-			def __iter__(self):
-				return self
-
-			def __next__(self):
-				return self.next()
-
-			def decodeLebOld(self):
-				a = bytearray(x for x in self.__byteArrayGen__(self.mvd, self.data, self.offset, self.size))
-				sz = len(a)
-				self.offset += sz
-
-				decoded = 0
-
-				for i in SafeRange(self.mvd, sz):
-					decoded = decoded + ((a[i] & 0x7f) << (i * 7)) # leb128 decoding
-
-				return decoded
-
-			def decodeLeb(self):
-				v14 = self.data[self.offset]
-				self.offset += 1
-
-				decoded = v14
-				if ( v14 >= 0x80 ):
-					decoded = v14 & 0x7F
-					v16 = 7
-
-					for _ in SafeRange(self.mvd, 4):
-						v18 = self.data[self.offset]
-						self.offset += 1
-						v19 = (v18 & 0x7F) << v16
-						v16 += 7
-						decoded |= v19
-						if ( v18 < 0x80 ):
-							break
-						
-				return decoded
-
-			def getIndex(self):
-				decoded = self.decodeLeb()
-
-				current = decoded & 1 # meshopt
-
-				d = (decoded >> 2) ^ -((decoded & 2) != 0) # stolen from gaijin
-				index = self.buffer[current] + d
-
-				self.buffer[current] = index
-
-				return index
-
-			def getValidIndex(self):
-				if self.offset >= self.size or self.mvd.shouldTerminate:
-					raise StopIteration()
-
-				return self.getIndex()
-
-			def next(self):
-				a = self.getValidIndex()
-
-				if a == None:
-					return self.next()
-
-				b = self.getValidIndex()
-
-				if b == None:
-					return self.next()
-
-				c = self.getValidIndex()
-
-				if c == None:
-					return self.next()
-
-				return (a, c, b) # reversed order somehow fixes normals???
-
 		def __repr__(self):
 			return f"<VertexData {self.__gvData.idx} vCnt={self.__gvData.getVertexCnt()}>"
 
 		def __init__(self, file:BinBlock, gvData):
-			self.__verts:tuple[tuple(float, float, float)] = None
-			self.__UVs:tuple[tuple(float, float)] = None
-			self.__faces:tuple[tuple(int, int, int)] = None
+			self.__verts:np.ndarray = None # (vCnt, 3) float64
+			self.__UVs:np.ndarray = None # (vCnt, 2) float64
+			self.__faces:np.ndarray = None # (fCnt, 3) uint32
 			self.__unimplemented = False
 
 			gvData:MatVData.GlobalVertexData = gvData
@@ -488,50 +428,69 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 			return self.__gvData
 		
 		class PARSECLASS(ABC):
+			dtype:tuple[str, int] = None # None if the field isn't stored in the vertex
+
+			@property
+			def sz(self):
+				return 0 if self.dtype is None else np.dtype(self.dtype).itemsize
+
 			@abstractmethod
-			def read(self, file:BinFile):
+			def decode(self, data:np.ndarray, cnt:int) -> np.ndarray:
 				...
 
 		class VERTEX(PARSECLASS):
-			...
+			field = "vertex"
 		
 		class UV(PARSECLASS):
-			...
+			field = "uv"
 
 		class SHORT_VERTEX(VERTEX):
-			def read(self, file:BinFile):
-				return [readSignedShort(file) / 32768, readSignedShort(file) / 32768, readSignedShort(file) / 32768]
+			dtype = ("<i2", 3)
+
+			def decode(self, data:np.ndarray, cnt:int):
+				return data / 32768
 
 		class FLOAT_VERTEX(VERTEX):
-			def read(self, file:BinFile):
-				return list(unpack("fff", file.read(12)))
+			dtype = ("<f4", 3)
+
+			def decode(self, data:np.ndarray, cnt:int):
+				return data.astype(np.float64)
 
 		class NO_UV(UV):
-			def read(self, file:BinFile):
-				return (0, 0)
+			def decode(self, data:np.ndarray, cnt:int):
+				return np.zeros((cnt, 2))
 
 		class SHORT_UV(UV):
-			def read(self, file:BinFile):
-				return (readSignedShort(file) / 4096, 1 + (-readSignedShort(file) / 4096))
+			dtype = ("<i2", 2)
+
+			def decode(self, data:np.ndarray, cnt:int):
+				uv = data / 4096
+				uv[:, 1] = 1 - uv[:, 1]
+
+				return uv
 
 		class FLOAT_UV(UV):
-			def read(self, file:BinFile):
-				uv = unpack("ff", file.read(8))
+			dtype = ("<f4", 2)
 
-				return (uv[0], -uv[1])
-		
-		class HALFFLOAT_UV(UV):
-			def read(self, file:BinFile):
-				uv = unpack("ee", file.read(4))
+			def decode(self, data:np.ndarray, cnt:int):
+				uv = data.astype(np.float64)
+				uv[:, 1] = -uv[:, 1]
 
-				return (uv[0], -uv[1])
+				return uv
+		
+		class HALFFLOAT_UV(FLOAT_UV):
+			dtype = ("<f2", 2)
 		
 		class PADDING(PARSECLASS):
 			def __init__(self, sz:int):
-				self.sz = sz
+				self.__sz = sz
 			
-			def read(self, file:BinFile):
-				file.seek(self.sz, 1)
+			@property
+			def sz(self):
+				return self.__sz
+			
+			def decode(self, data:np.ndarray, cnt:int):
+				return None
 
 
 		FORMATS:dict[int, dict[int, tuple[PARSECLASS]]] = {
@@ -591,40 +550,72 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 			},
 		}
 
+		__DTYPES:dict[tuple[int, int], np.dtype] = {}
+
 		def getParser(self, format:int, vStride:int):
 			if format in self.FORMATS:
 				return self.FORMATS[format].get(vStride)
 			else:
 				return None
+		
+		@classmethod
+		def compileParser(cls, parser:tuple[PARSECLASS], vStride:int) -> np.dtype:
+			names, formats, offsets = [], [], []
+			ofs = 0
+
+			for parseClass in parser:
+				parseClass:MatVData.VertexData.PARSECLASS
+
+				if parseClass.dtype is not None:
+					names.append(parseClass.field)
+					formats.append(parseClass.dtype)
+					offsets.append(ofs)
+				
+				ofs += parseClass.sz
+			
+			if ofs != vStride:
+				raise Exception(f"Storage format size mismatch: {ofs} != {vStride}")
+
+			return np.dtype({"names":names, "formats":formats, "offsets":offsets, "itemsize":vStride})
+		
+		def getDtype(self, format:int, vStride:int) -> np.dtype:
+			key = (format, vStride)
+			dtype = self.__DTYPES.get(key)
+
+			if dtype is None:
+				parser = self.getParser(format, vStride)
+
+				if parser is None:
+					return None
+
+				dtype = self.__DTYPES[key] = self.compileParser(parser, vStride)
+			
+			return dtype
 
 		def __processVertices__(self, file:BinBlock):
 			format = self.__gvData.getStorageFormat()
 			vStride = self.__gvData.getVertexStride()
 			vCnt = self.__gvData.getVertexCnt()
 
-			verts:list[list[float, float, float]] = [None] * vCnt
-			UVs:list[list[float, float]] = [None] * vCnt
+			dtype = self.getDtype(format, vStride)
 
-			parser = self.getParser(format, vStride)
-
-			if parser is None:
+			if dtype is None:
 				raise Exception(f"Unimplemented storage format {format}-{vStride}")
-			else:
-				log.log(f"Processing {vCnt} vertices vFormat={format} vStride={vStride}")
+			
+			log.log(f"Processing {vCnt} vertices vFormat={format} vStride={vStride}")
 
-				for i in SafeRange(self, vCnt):
-					for parseClass in SafeIter(self, parser):
-						parseClass:MatVData.VertexData.PARSECLASS
+			data = file.readArray(dtype, vCnt)
+			parser = self.getParser(format, vStride)
 
-						if isinstance(parseClass, MatVData.VertexData.PADDING):
-							parseClass.read(file)
-						elif isinstance(parseClass, MatVData.VertexData.VERTEX):
-							verts[i] = parseClass.read(file)
-						elif isinstance(parseClass, MatVData.VertexData.UV):
-							UVs[i] = parseClass.read(file)
+			for parseClass in parser:
+				parseClass:MatVData.VertexData.PARSECLASS
 
-			self.__verts = verts
-			self.__UVs = UVs
+				if isinstance(parseClass, MatVData.VertexData.VERTEX):
+					self.__verts = parseClass.decode(data["vertex"], vCnt)
+					self.__verts.flags.writeable = False # shared through the MatVData cache
+				elif isinstance(parseClass, MatVData.VertexData.UV):
+					self.__UVs = parseClass.decode(data["uv"] if parseClass.dtype is not None else None, vCnt)
+					self.__UVs.flags.writeable = False
 			
 		def __processFaces__(self, file:BinBlock):
 			if self.__unimplemented:
@@ -643,9 +634,9 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 
 				# file.seek(1, 1)
 
-				count = (sz // 6)  - sz % 6
+				count = max((sz // 6)  - sz % 6, 0)
 
-				faces = tuple(unpack("HHH", file.read(6)) for i in SafeRange(self, count))
+				faces = file.readArray("<u2", count * 3).reshape(count, 3).astype(np.uint32)
 
 			else:
 				log.log("Processing packed faces")
@@ -653,13 +644,19 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 				file.seek(1, 1)
 				
 				encodedSize = pSz - 0x5
-				faces = tuple(f for f in self.__decodeIndexSequence__(file.read(encodedSize), encodedSize, self))
+				faces = decodeIndexSequence(file.read(encodedSize), self)
 
 			log.log(f"Processed {len(faces)} faces")
 			log.subLevel()
 
+			faces.flags.writeable = False # shared through the MatVData cache
+
 			self.__faces = faces
 
+		@property
+		def nbytes(self):
+			return sum(array.nbytes for array in (self.__verts, self.__UVs, self.__faces) if array is not None)
+
 		def getVertices(self):
 			return self.__verts
 		
@@ -669,41 +666,30 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 		def getFaces(self):
 			return self.__faces
 
-		def getObj(self):
+		def writeObj(self, file):
 			verts, UVs, faces = self.__verts, self.__UVs, self.__faces
 
-			if not verts:
+			if verts is None:
 				raise NotImplementedError("Can't get an obj out of an unimplemented model format")
 
-			obj = ""
-
 			log.log(f"Exporting {len(verts)} vertices")
 
-			for v in SafeIter(self, verts):
-				obj += f"v {v[0]:.4f} {v[1]:.4f} {v[2]:.4f}\n"
+			writeRows(file, "v %.4f %.4f %.4f\n", verts, self)
 			
 			log.log(f"Exporting {len(UVs)} UVs")
 
-			for v in SafeIter(self, UVs):
-				obj += f"vt {v[0]:.4f} {v[1]:.4f}\n"
+			writeRows(file, "vt %.4f %.4f\n", UVs, self)
 
 			log.log(f"Exporting {len(faces)} faces")
-			
-			for face in SafeIter(self, faces):
-				f = ""
 
-				for idx in SafeIter(self, face):
-					idx += 1
+			writeRows(file, "f %d/%d %d/%d %d/%d\n", np.repeat(faces.astype(np.int64) + 1, 2, axis = 1), self)
+		
+		def getObj(self):
+			file = StringIO()
 
-					f += f" {idx}/{idx}"
-				
-				if f == "":
-					continue
+			self.writeObj(file)
 
-				
-				obj += f"f{f}\n"
-			
-			return obj
+			return file.getvalue()
 
 	def getVDCount(self):
 		return len(self.__gvdata)
@@ -730,13 +716,7 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 		if not self.__dataComputed:
 			self.computeData()
 		
-		ofs = self.__vdStartOfs
-
-		for i in SafeRange(self, idx):
-			gvData = self.__gvdata[i]
-			ofs += gvData.getFullVertexDataSz()
-
-		return ofs
+		return self.__vdOffsets[idx]
 	
 	def getGlobalVertexData(self, idx):
 		return self.__gvdata[idx]
@@ -747,22 +727,32 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 		
 		vdCnt = len(self.__gvdata)
 
-		if idx < 0 or idx > vdCnt:
+		if idx < 0 or idx >= vdCnt:
 			raise ValueError(f"Impossible vData ID {idx} (vdCnt = {vdCnt})")
 		
+		vertexData = self.__vdCache.get(idx)
+
+		if vertexData is not None:
+			return vertexData
+		
 		file = self.__file
 		gvData = self.__gvdata[idx]
 
-		file.seek(self.__vdStartOfs, 0)
-
-		for i in SafeRange(self, 0, idx):
-			file.seek(self.__gvdata[i].getFullVertexDataSz(), 1)
+		file.seek(self.__vdOffsets[idx], 0)
 		
 		sz = gvData.getFullVertexDataSz()
 
 		log.log(f"Retrieving vertex data {idx} @ {file.tell()} sz={sz}")
 
-		return self.VertexData(file.readBlock(sz), gvData)
+		vertexData = self.VertexData(file.readBlock(sz), gvData)
+
+		if not self.shouldTerminate: # don't keep partially decoded data around
+			self.__vdCache.put(idx, vertexData, vertexData.nbytes)
+
+		return vertexData
+	
+	def clearVertexDataCache(self):
+		self.__vdCache.clear()
 
 	def quickExportVDataToObj(self, idx:int, suffix:str = "", outdir:str = None):
 		log.log(f"Quick exporting {idx} as OBJ")
@@ -773,15 +763,21 @@ class MatVData(Terminable, FilePathable): # stores material and vertex data :D
 		if outdir is not None:
 			fileName = path.join(outdir, fileName)
 
-		obj = self.getVertexData(idx).getObj()
-
 		file = open(fileName, "w")
-		file.write(obj)
+
+		try:
+			self.getVertexData(idx).writeObj(file)
+		except:
+			file.close()
+			remove(fileName)
+
+			raise
+
 		file.close()
 
 		log.subLevel()
 
-		log.log(f"Wrote {len(obj)} to {fileName}")
+		log.log(f"Wrote {path.getsize(fileName)} to {fileName}")
 
 	@property
 	def hasMaterials(self):
@@ -1,24 +1,24 @@
 import sys
-from os import path, getcwd, mkdir, makedirs
+from os import path, getcwd, mkdir, makedirs, remove
 from typing import Iterable, Union
 
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
 
 import util.log as log
-from io import BytesIO
+from io import BytesIO, StringIO
 from util.fileread import *
 from util.enums import *
 from util.decompression import CompressedData, zlibDecompress
-from util.misc import getResPath, vectorTransform, matrixMul, matrixToEuler
+from util.misc import getResPath, vectorTransform, vectorsTransform, matrixMul, matrixToEuler
 from util.assetcacher import AssetCacher
 from struct import unpack, pack
 from parse.datablock import *
 from util.terminable import Packed, SafeRange, SafeIter, SafeEnumerate, Terminable
 from parse.mesh import MatVData, InstShaderMeshResource, ShaderMesh
-from parse.material import MaterialData, MaterialTemplateLibrary,  computeMaterialNames, TexturePathDict
+from parse.material import MaterialData, MaterialTemplateLibrary,  computeMaterialNames, TexturePathDict, exportTextureBatch
 from abc import abstractmethod, ABC
-from math import sqrt
+import numpy as np
 
 
 PHYSMAT_TO_SURFACEPROP = {
@@ -107,24 +107,22 @@ DMF_MAT_PTR = 0x8
 DMF_SKE_PTR = 0xC
 DMF_NO_PARENT = -1
 
-def subVert(v1, v2):
-	return (v1[0] - v2[0], v1[1] - v2[1], v1[2] - v2[2])
+def computeNormals(faceVerts:np.ndarray, faces:np.ndarray, vertCnt:int) -> np.ndarray:
+	# smooth normals: face normals are summed into every vertex they touch, in face order, then normalized
+	faceNormals = np.cross(faceVerts[:, 1] - faceVerts[:, 0], faceVerts[:, 2] - faceVerts[:, 0])
+	vIds = faces.ravel()
 
-def crossProduct(v1, v2):
-	return (v1[1] * v2[2] - v1[2] * v2[1],
-			v1[2] * v2[0] - v1[0] * v2[2],
-			v1[0] * v2[1] - v1[1] * v2[0])
+	normals = np.empty((vertCnt, 3))
 
-def getNormal(v1, v2, v3):
-	return crossProduct(subVert(v2, v1), subVert(v3, v1))
-
-def normalize(normal):
-	length = sqrt(normal[0] * normal[0] + normal[1] * normal[1] + normal[2] * normal[2])
+	for axis in range(3):
+		normals[:, axis] = np.bincount(vIds, np.repeat(faceNormals[:, axis], 3), vertCnt)
 	
-	if length != 0.0:
-		normal[0] /= length
-		normal[1] /= length
-		normal[2] /= length
+	length = np.sqrt(normals[:, 0] * normals[:, 0] + normals[:, 1] * normals[:, 1] + normals[:, 2] * normals[:, 2])
+	nonZero = length != 0.0
+
+	normals[nonZero] /= length[nonZero, None]
+
+	return normals
 
 class SkinnedMesh(Terminable):
 	skinNodes:tuple[int]
@@ -252,50 +250,18 @@ class SkinnedMeshResource(Terminable):
 
 
 class SMD(Terminable):
-	class Triangle:
-		def __init__(self, 
-					material:str, 
-					verts:tuple[tuple, tuple, tuple],
-					UVs:tuple[tuple, tuple]):
-			self.material = material
-			self.verts = verts
-			self.normals = ((0, 0, 0), (0, 0, 0), (0, 0, 0))
-			self.UVs = UVs
-		
-		def getNormal(self):
-			return self.normal
-
-		def getString(self, boneIdx:int = 0, weight:float = 1):
-			return "\n".join((
-				self.material,
-				*(
-					f"{boneIdx} {self.formatTuple(self.verts[i])} {self.formatTuple(self.normals[i])} {self.formatTuple(self.UVs[i])}"# {weight}"
-					for i in range(3)
-				)
-			))
-		
-		def transform(self, matrix):
-			self.verts = (
-				vectorTransform(matrix, self.verts[0]),
-				vectorTransform(matrix, self.verts[1]),
-				vectorTransform(matrix, self.verts[2])
-			)
-		
-		def formatTuple(self, array:tuple[float]):
-			return " ".join(tuple(f"{v:.6f}" for v in array))
-	
 	def __init__(self, name:str, baseName:str):
 		self.__name = name
 		self.__baseName = baseName
-		self.__triangles:list[SMD.Triangle] = []
+		self.__materials:list[tuple[int, str]] = [] # (first triangle, material)
+		self.__verts:np.ndarray = np.empty((0, 3, 3))
+		self.__normals:np.ndarray = np.empty((0, 3, 3))
+		self.__UVs:np.ndarray = np.empty((0, 3, 2))
 		self.__boneIdx = 0
 		self.__weight = 1
 	
 	def transform(self, matrix):
-		for tri in SafeIter(self, self.__triangles):
-			tri:SMD.Triangle
-
-			tri.transform(matrix)
+		self.__verts = vectorsTransform(matrix, self.__verts).reshape(-1, 3, 3)
 	
 	@property
 	def baseName(self):
@@ -304,26 +270,41 @@ class SMD(Terminable):
 	@property
 	def name(self):
 		return self.__name
+	
+	@property
+	def triangleCount(self):
+		return len(self.__verts)
 
-	def newTriangle(self,
-			material:str, 
-			verts:tuple[tuple, tuple, tuple],
-			UVs:tuple[tuple, tuple, tuple]):
-		triangle = self.Triangle(material, verts, UVs)
-
-		self.__triangles.append(triangle)
-
-		return triangle
+	def setTriangles(self,
+			materials:list[tuple[int, str]],
+			verts:np.ndarray,
+			normals:np.ndarray,
+			UVs:np.ndarray):
+		self.__materials = materials
+		self.__verts = verts
+		self.__normals = normals
+		self.__UVs = UVs
 	
 	def setBone(self, idx:int, weight:float = 1.0):
 		self.__boneIdx = idx
 		self.__weight = weight
 	
 	def getString(self):
-		return "\n".join((
-			"triangles",
-			"\n".join(t.getString(self.__boneIdx, self.__weight) for t in SafeIter(self, self.__triangles))
-		))
+		if self.triangleCount == 0:
+			return "triangles\n"
+
+		lineFmt = f"\n{self.__boneIdx}" + " %.6f" * 8 # {weight}
+		rows = np.concatenate((self.__verts, self.__normals, self.__UVs), axis = 2)
+		ends = (*(start for start, _ in self.__materials[1:]), self.triangleCount)
+
+		triangles = ["triangles"]
+
+		for (start, material), end in SafeIter(self, zip(self.__materials, ends)):
+			triFmt = f"\n{material.replace('%', '%%')}" + lineFmt * 3
+
+			triangles.append((triFmt * (end - start)) % tuple(rows[start:end].ravel().tolist()))
+		
+		return "".join(triangles)
 
 class SourceModel(Terminable):
 	def __init__(self, name:str, model, collision = None, allLODs:tuple = None):
@@ -624,13 +605,39 @@ class SourceModel(Terminable):
 	def name(self):
 		return self.__name
 
+class ChunkedArray: # append-only (n, width) array, chunks are only concatenated when read
+	def __init__(self, width:int, dtype):
+		self.__width = width
+		self.__dtype = dtype
+		self.__array = np.empty((0, width), dtype)
+		self.__chunks:list[np.ndarray] = []
+		self.__cnt = 0
+	
+	def append(self, rows):
+		rows = np.asarray(rows, self.__dtype).reshape(-1, self.__width)
+
+		if len(rows) > 0:
+			self.__chunks.append(rows)
+			self.__cnt += len(rows)
+	
+	@property
+	def array(self) -> np.ndarray:
+		if len(self.__chunks) > 0:
+			self.__array = np.concatenate((self.__array, *self.__chunks))
+			self.__chunks = []
+		
+		return self.__array
+	
+	def __len__(self):
+		return self.__cnt
+
 class Model(Terminable):
 	class Object:
 		def __init__(self, name:str, skinned:bool):
 			self.__name = name
 			self.__skinned = skinned
 
-			self.faces:list[tuple[int, int, int]] = []
+			self.__faces = ChunkedArray(3, np.uint32)
 			self.materials:dict[int, str] = {0:f"none_{name}"}
 		
 		@property
@@ -641,15 +648,23 @@ class Model(Terminable):
 		def skinned(self):
 			return self.__skinned
 		
+		@property
+		def faces(self) -> np.ndarray:
+			return self.__faces.array
+		
 		@property
 		def faceCount(self):
-			return len(self.faces)
+			return len(self.__faces)
 		
 		def appendFace(self, face:tuple[int, int, int]):
-			self.faces.append(face)
+			self.__faces.append(face)
 		
-		def setFaces(self, faces:tuple[tuple[int, int, int]]):
-			self.faces = faces
+		def appendFaces(self, faces:np.ndarray):
+			self.__faces.append(faces)
+		
+		def setFaces(self, faces:np.ndarray):
+			self.__faces = ChunkedArray(3, np.uint32)
+			self.__faces.append(faces)
 		
 		def appendMaterial(self, materialName:str, startFaceIdx:int = None):
 			if startFaceIdx == None:
@@ -681,24 +696,20 @@ class Model(Terminable):
 		self.__exportName = exportName
 
 		self.__objects:list[Model.Object] = []
-		self.__vertices:list[tuple[float, float, float]] = []
-		self.__uvs:list[tuple[float, float]] = []
+		self.__vertices = ChunkedArray(3, np.float64)
+		self.__uvs = ChunkedArray(2, np.float64)
+		self.__normals:dict[bool, tuple[tuple, np.ndarray]] = {} # posed -> (geometry counts and pose, normals)
 
 	# 
 
-	def __scaleVertex(self, vertex:tuple[float, float, float]):
-		return (
-				(vertex[0] * self.__vertScale[0]) + self.__vertOffet[0],
-				(vertex[1] * self.__vertScale[1]) + self.__vertOffet[1],
-				(vertex[2] * self.__vertScale[2]) + self.__vertOffet[2],
-		 	  )
+	def appendVerts(self, verts:np.ndarray, UVs:np.ndarray, scale:bool = True):
+		verts = np.asarray(verts, np.float64).reshape(-1, 3)
 
-	def appendVerts(self, verts:Iterable[tuple[float, float, float]], UVs:Iterable[tuple[float, float]], scale:bool = True):
 		if scale:
-			verts = tuple(self.__scaleVertex(v) for v in verts)
+			verts = verts * np.asarray(self.__vertScale[:3], np.float64) + np.asarray(self.__vertOffet[:3], np.float64)
 		
-		self.__vertices.extend(verts)
-		self.__uvs.extend(UVs)
+		self.__vertices.append(verts)
+		self.__uvs.append(UVs)
 	
 	def __getitem__(self, key:Union[int, str]):
 		if isinstance(key, str):
@@ -727,9 +738,9 @@ class Model(Terminable):
 		log.log(f"Merging {mdl.name} with {self.name}")
 		log.addLevel()
 
-		self.appendVerts(mdl.__vertices, mdl.__uvs, scale = False)
+		self.appendVerts(mdl.vertices, mdl.uvs, scale = False)
 		
-		log.log(f"Appended {len(mdl.__vertices)} vertices and UVs (offset = {vOfs})")
+		log.log(f"Appended {mdl.vertCnt} vertices and UVs (offset = {vOfs})")
 
 		if mdl.materials is not None:
 			if self.materials is None:
@@ -743,52 +754,52 @@ class Model(Terminable):
 
 			newObj = self.newObject(obj.name, obj.skinned)
 			
-			log.log(f"Merging {obj.name}'s {len(obj.faces)} faces")
+			log.log(f"Merging {obj.name}'s {obj.faceCount} faces")
 
 			for startIdx in obj.materials:
 				newObj.appendMaterial(obj.materials[startIdx], startIdx)
 			
-			for face in SafeIter(self, obj.faces):
-				newObj.appendFace(tuple(idx + vOfs for idx in face))
+			newObj.appendFaces(obj.faces + np.uint32(vOfs))
 		
 		log.subLevel()
-
-	def __getTuple__(self, listOfLists:list[list[tuple]], id:int):
-		ofs = 0
-
-		for list in SafeIter(self, listOfLists):
-			cnt = len(list)
-
-			if ofs + cnt > id:
-				# print(ofs,cnt, id)
-				return list[id - ofs]
-			else:
-				ofs += cnt
-
-		raise IndexError(f"Can't find {id} ({ofs=})")
 	
-	def getUV(self, id:int) -> tuple[float, float, float]:
-		return self.__uvs[id]
+	def getUV(self, id:int) -> tuple[float, float]:
+		return tuple(self.uvs[id])
 	
 	def getVertex(self, id:int, scale:bool = False, parentBone = None) -> tuple[float, float, float]:
-		v = self.__vertices[id]
+		return tuple(self.getFaceVertices(np.array(((id, ), )), scale, parentBone)[0, 0])
+	
+	def getFaceVertices(self, faces:np.ndarray, scale:bool = False, parentBone = None) -> np.ndarray:
+		verts = self.vertices[faces] # (fCnt, 3, 3)
 
 		if parentBone is not None:
-			v = vectorTransform(parentBone.wtm, v)
-
-		if not scale:
-			return v
-		else:
-			return (v[0] * VERTEX_SCALE, v[1] * VERTEX_SCALE, v[2] * VERTEX_SCALE)
+			verts = vectorsTransform(parentBone.wtm, verts).reshape(verts.shape)
+		
+		if scale:
+			verts = verts * VERTEX_SCALE
+		
+		return verts
+	
+	def getObjectParentBone(self, obj:Object, ignoreSkinned:bool = True):
+		if self.__skeleton is None or (ignoreSkinned and obj.skinned):
+			return None
+		
+		return self.__skeleton.getNodeByName(obj.name)
 	
 	def getFaceCount(self):
 		cnt = 0
 
 		for obj in SafeIter(self, self.__objects):
-			cnt += len(obj.faces)
+			cnt += obj.faceCount
 		
 		return cnt
+	
+	def getFaces(self) -> np.ndarray:
+		if len(self.__objects) == 0:
+			return np.empty((0, 3), np.uint32)
 
+		return np.concatenate(tuple(obj.faces for obj in self.__objects))
+	
 	def __iter__(self):
 		return self.__objects.__iter__()
 	
@@ -807,155 +818,137 @@ class Model(Terminable):
 	
 	# Model export
 
-	def getOBJ(self):
-		objVerts = [""] * self.vertCnt
-		objUVs = [""] * self.vertCnt
-		objNormals = ["vn 0.0 0.0 0.0"] * self.vertCnt
-		objFaces = []
+	def getPosedFaceVertices(self, obj:Object, scale:bool = False) -> np.ndarray:
+		# what OBJ and SMD get: rigid objects follow their parent bone, Z is flipped
+		return self.getFaceVertices(obj.faces, scale, self.getObjectParentBone(obj)) * (1, 1, -1)
+
+	def getNormals(self, posed:bool = False) -> np.ndarray:
+		geometry = (self.vertCnt, self.getFaceCount(), len(self.__objects))
+
+		if posed: # the pose of every object is part of the key, a new skeleton or moved bone invalidates it
+			geometry += tuple(None if bone is None else bone.wtm for bone in (self.getObjectParentBone(obj) for obj in self.__objects))
+
+		cached = self.__normals.get(posed)
+
+		if cached is not None and cached[0] == geometry:
+			return cached[1]
 		
-		normals = [None] * self.vertCnt
-		normal = [None] * 3
+		log.log("Computing normals")
 
-		fV = lambda v: f"{v:.4f}"
-		ff = lambda x: f"{x + 1}/{x + 1}/{x + 1}"
+		faces = self.getFaces()
 
-		skeleton = self.__skeleton
+		if posed:
+			faceVerts = np.concatenate((np.empty((0, 3, 3)), *(self.getPosedFaceVertices(obj) for obj in SafeIter(self, self.__objects))))
+		else:
+			faceVerts = self.vertices[faces]
+		
+		normals = computeNormals(faceVerts, faces, self.vertCnt)
+		normals.flags.writeable = False
+
+		self.__normals[posed] = (geometry, normals)
 
-		faceOfs = 0
+		return normals
+	
+	def writeOBJ(self, file):
+		objVerts = self.vertices * (1, 1, -1) # vertices posed by the first object that uses them
+		posed = np.zeros(self.vertCnt, bool)
 
 		for obj in SafeIter(self, self.__objects):
 			obj:Model.Object
 
-			objFaces.append(f"g {obj.name}")
+			faces = obj.faces
+			vIds, firstCorner = np.unique(faces.ravel(), return_index = True)
+			unposed = ~posed[vIds]
 
-			if skeleton is not None and not obj.skinned:
-				parentNode = skeleton.getNodeByName(obj.name)
-			else:
-				parentNode = None
+			objVerts[vIds[unposed]] = self.getPosedFaceVertices(obj).reshape(-1, 3)[firstCorner[unposed]]
+			posed[vIds[unposed]] = True
 
-			for i in SafeRange(self, obj.faceCount):
-				if i in obj.materials:
-					objFaces.append(f"usemtl {obj.materials[i]}")
-				
-				f = obj.faces[i]
+		log.log(f"Writing {self.vertCnt} vertices")
 
-				for k, vId in SafeEnumerate(self, f):
-					v = self.getVertex(vId, parentBone = parentNode)
-					normal[k] = (v[0], v[1], -v[2])
-					
-					if objVerts[vId] == "":
-						objVerts[vId] = f"v {fV(v[0])} {fV(v[1])} {fV(-v[2])}"
+		writeRows(file, "v %.4f %.4f %.4f\n", objVerts, self)
+		writeRows(file, "vt %.4f %.4f\n", self.uvs, self)
+		writeRows(file, "vn %.4f %.4f %.4f\n", self.getNormals(posed = True), self)
 
-						uv = self.getUV(vId)
+		log.log(f"Writing {self.getFaceCount()} faces")
 
-						objUVs[vId] = f"vt {fV(uv[0])} {fV(uv[1])}"
-				
-				self.generateNormal(normal, normals, f, populate = False)
-				
-				objFaces.append(f"f {ff(f[0])} {ff(f[1])} {ff(f[2])}")
+		for obj in SafeIter(self, self.__objects):
+			obj:Model.Object
 
-		log.log("Normalizing normals")
+			file.write(f"g {obj.name}\n")
 
-		for k, v in SafeEnumerate(self, normals):
-			if v is not None:
-				normalize(v)
-				
-				objNormals[k] = f"vn {fV(v[0])} {fV(v[1])} {fV(v[2])}"
-
-
-		return Model.__join((
-			Model.__join(objVerts),
-			Model.__join(objUVs),
-			Model.__join(objNormals),
-			Model.__join(objFaces),
-		))
-	
-	def generateNormal(self, 
-					normal:list[float, float, float], 
-					normals:list[list[float, float, float]], 
-					face:tuple[int, int, int],
-					populate:bool = True):
-		if populate:
-			normal[0] = self.__vertices[face[0]]
-			normal[1] = self.__vertices[face[1]]
-			normal[2] = self.__vertices[face[2]]
-
-		normal = getNormal(*normal)
-
-		for idx in SafeIter(self, face):
-			if normals[idx] is None:
-				normals[idx] = [0, 0, 0]
-			
-			normals[idx][0] += normal[0]
-			normals[idx][1] += normal[1]
-			normals[idx][2] += normal[2]
+			faces = np.repeat(obj.faces.astype(np.int64) + 1, 3, axis = 1)
+			matStarts = sorted(i for i in obj.materials if 0 <= i < obj.faceCount)
+			ends = (*matStarts[1:], obj.faceCount)
 
-	def getDMF(self):
+			if len(matStarts) == 0 or matStarts[0] != 0:
+				writeRows(file, "f %d/%d/%d %d/%d/%d %d/%d/%d\n", faces[:matStarts[0] if len(matStarts) > 0 else None], self)
+
+			for start, end in SafeIter(self, zip(matStarts, ends)):
+				file.write(f"usemtl {obj.materials[start]}\n")
+
+				writeRows(file, "f %d/%d/%d %d/%d/%d %d/%d/%d\n", faces[start:end], self)
+	
+	def getOBJ(self):
+		file = StringIO()
+
+		self.writeOBJ(file)
+
+		return file.getvalue()
+
+	def writeDMF(self, file):
+		# sections go straight from the geometry arrays into the file, DMF_MAT_PTR/DMF_SKE_PTR are left for the caller to patch
 		log.log("Writing model DMF")
 		log.addLevel()
-		
 
-		normals = [None] * self.vertCnt
-		normal = [None] * 3
+		file.write(DMF_MAGIC)
+		file.write(pack("III", DMF_VDATA_OFS, 0x0, 0x0))
+		file.write(pack("fff", *self.__vertScale[:3]))
+		file.write(pack("I", self.vertCnt))
 		
-		objBuffer = BBytesIO()
+		file.write(self.vertices.astype("<f4").tobytes())
+		file.write(self.getNormals().astype("<f4").tobytes())
+		file.write(self.uvs.astype("<f4").tobytes())
+
+		file.write(pack("I", len(self.__objects)))
+
+		objOfs = 0
 
 		for obj in SafeIter(self, self.__objects):
 			obj:Model.Object
 
-			log.log(f"Writing {obj.name} @ {objBuffer.tell()}")
+			log.log(f"Writing {obj.name} @ {objOfs}")
 
-			objBuffer.writeString(obj.name)
-			objBuffer.writeInt(1 if obj.skinned else 0)
-			objBuffer.writeInt(obj.faceCount)
+			header = BBytesIO()
+			header.writeString(obj.name)
+			header.writeInt(1 if obj.skinned else 0)
+			header.writeInt(obj.faceCount)
 
-			for f in SafeIter(self, obj.faces):
-				objBuffer.write(pack("III", *f))
+			faces = obj.faces.astype("<u4").tobytes()
 
-				self.generateNormal(normal, normals, f)
-
-			objBuffer.writeInt(len(obj.materials))
+			matBuffer = BBytesIO()
+			matBuffer.writeInt(len(obj.materials))
 
 			for faceIdx in obj.materials:
 				matName = obj.materials[faceIdx]
 
-				objBuffer.writeInt(faceIdx)
-				objBuffer.writeString(str(matName))
-
-
-
-		vertBuffer = BytesIO()
-		normalBuffer = BytesIO()
-		uvBuffer = BytesIO()
-		
-		for i in SafeRange(self, self.vertCnt):
-			normal = normals[i]
-			normalize(normal)
-
-			vertBuffer.write(pack("fff", *self.__vertices[i]))
-			normalBuffer.write(pack("fff", *normal))
-			uvBuffer.write(pack("ff", *self.__uvs[i]))
+				matBuffer.writeInt(faceIdx)
+				matBuffer.writeString(str(matName))
+			
+			for chunk in (header.getvalue(), faces, matBuffer.getvalue()):
+				file.write(chunk)
+				objOfs += len(chunk)
 
-		buffer = BBytesIO()
-		buffer.write(DMF_MAGIC)
+		log.subLevel()
 
-		buffer.write(pack("III", DMF_VDATA_OFS, 0x0, 0x0))
-		buffer.write(pack("fff", *self.__vertScale[:3]))
-		buffer.writeInt(self.vertCnt)
-		
-		buffer.write(vertBuffer.getvalue())
-		buffer.write(normalBuffer.getvalue())
-		buffer.write(uvBuffer.getvalue())
+	def getDMF(self):
+		buffer = BytesIO()
 
-		buffer.writeInt(len(self.__objects))
-		buffer.write(objBuffer.getvalue())
+		self.writeDMF(buffer)
 
 		value = buffer.getvalue()
 
 		buffer.close()
 
-		log.subLevel()
-
 		return value
 
 	def getMaterialDMF(self):
@@ -991,11 +984,7 @@ class Model(Terminable):
 
 		smdFiles:list[SMD] = []
 		
-		
-		invY = lambda v: (v[0], v[1], -v[2])
-
-		# normal = [None] * 3
-		normals = [None] * self.vertCnt
+		normals = self.getNormals(posed = True)
 		skeleton = self.__skeleton
 
 		for obj in SafeIter(self, self.__objects):
@@ -1017,10 +1006,11 @@ class Model(Terminable):
 			
 			getFcnt = lambda id: (id * MAX_SOURCE_VERTS) // 3
 
-			if skeleton is not None:
-				parentBone = skeleton.getNodeByName(obj.name)
-			else:
-				parentBone = None
+			parentBone = self.getObjectParentBone(obj, ignoreSkinned = False)
+
+			faces = obj.faces
+			faceVerts = self.getPosedFaceVertices(obj, True)
+			matStarts = sorted(obj.materials)
 
 			for objId in SafeRange(self, subObjCnt):
 				if subObjCnt > 1:
@@ -1029,33 +1019,18 @@ class Model(Terminable):
 				else:
 					smd = SMD(f"{obj.name}{suffix}", obj.name)
 				
-				for i in SafeRange(self, getFcnt(objId), min(getFcnt(objId + 1), obj.faceCount)):
-					if i in obj.materials:
+				start, end = getFcnt(objId), min(getFcnt(objId + 1), obj.faceCount)
+				materials = []
+
+				for i in matStarts:
+					if i <= start:
 						curMat = obj.materials[i]
-					
-					f = obj.faces[i]
-					
-					verts = (
-						invY(self.getVertex(f[0], True, parentBone if not obj.skinned else None)),
-						invY(self.getVertex(f[1], True, parentBone if not obj.skinned else None)),
-						invY(self.getVertex(f[2], True, parentBone if not obj.skinned else None))
-					)
-					
-					self.generateNormal(verts, normals, f, populate = False)
-
-					UVs = (
-						self.getUV(f[0]),
-						self.getUV(f[1]),
-						self.getUV(f[2])
-					)
-
-					tri = smd.newTriangle(curMat, verts, UVs)
-
-					tri.normals = (
-						normals[f[0]],
-						normals[f[1]],
-						normals[f[2]]
-					)
+					elif i < end:
+						materials.append((i - start, obj.materials[i]))
+				
+				materials.insert(0, (0, curMat))
+
+				smd.setTriangles(materials, faceVerts[start:end], normals[faces[start:end]], self.uvs[faces[start:end]])
 
 				if parentBone is not None and len(skeleton.getNodes()) <= MAX_SOURCE_BONES:
 					smd.setBone(parentBone.idx)
@@ -1063,13 +1038,6 @@ class Model(Terminable):
 				smdFiles.append(smd)
 			
 			log.subLevel()
-		
-		log.log("Normalizing normals")
-
-		for normal in SafeIter(self, normals):
-			if normal is not None:
-				normalize(normal)
-
 
 		log.subLevel()
 
@@ -1081,8 +1049,7 @@ class Model(Terminable):
 		log.addLevel()
 
 		fileName = f"{self.exportName}.obj"
-
-		obj = self.getOBJ()
+		filePath = output + "/" + fileName
 
 		if self.materials is not None:
 			log.log("Writing MTL")
@@ -1099,15 +1066,24 @@ class Model(Terminable):
 
 			log.subLevel()
 
-			obj = "mtllib " + self.exportName + ".mtl\n" + obj
+		file = open(filePath, "w")
+
+		try:
+			if self.materials is not None:
+				file.write("mtllib " + self.exportName + ".mtl\n")
+
+			self.writeOBJ(file)
+		except:
+			file.close()
+			remove(filePath)
+
+			raise
 
-		file = open(output + "/" + fileName, "w")
-		file.write(obj)
 		file.close()
 
 		log.subLevel()
 
-		log.log(f"Wrote {len(obj)} bytes to {fileName}")
+		log.log(f"Wrote {path.getsize(filePath)} bytes to {fileName}")
 	
 	def exportDmf(self, output:str = getcwd(), exportTexture:bool = True, forceConvert:bool = False):
 		log.log(f"Exporting {self.exportName} as DMF")
@@ -1116,32 +1092,46 @@ class Model(Terminable):
 		self.exportTextures(output, exportTexture, forceConvert = forceConvert)
 
 		fileName = f"{self.exportName}.dmf"
-		buffer = BBytesIO(self.getDMF())
+		filePath = output + "/" + fileName
 
-		if self.materials is not None:
-			buffer.seek(DMF_MAT_PTR, 0)
-			matDmf = self.getMaterialDMF()
-			buffer.writeInt(len(buffer.getvalue()))
-			buffer.seek(0, 2)
-			buffer.write(matDmf)
-		
-		if self.skeleton is not None:
-			buffer.seek(DMF_SKE_PTR, 0)
-			skeDmf = self.getSkeletonDMF()
-			buffer.writeInt(len(buffer.getvalue()))
-			buffer.seek(0, 2)
-			buffer.write(skeDmf)
-
-		dat = buffer.getvalue()
-		buffer.close()
+		# the trailing sections are built first so that a failure doesn't leave a half patched file behind
+		matDmf = self.getMaterialDMF() if self.materials is not None else None
+		skeDmf = self.getSkeletonDMF() if self.skeleton is not None else None
+
+		file = open(filePath, "wb")
+
+		try:
+			self.writeDMF(file)
+
+			if matDmf is not None:
+				self.__patchDMFPtr(file, DMF_MAT_PTR)
+				file.write(matDmf)
+			
+			if skeDmf is not None:
+				self.__patchDMFPtr(file, DMF_SKE_PTR)
+				file.write(skeDmf)
+
+			size = file.tell()
+		except:
+			file.close()
+			remove(filePath)
+
+			raise
 
-		file = open(output + "/" + fileName, "wb")
-		file.write(dat)
 		file.close()
 
 		log.subLevel()
 
-		log.log(f"Wrote {len(dat)} bytes to {fileName}")
+		log.log(f"Wrote {size} bytes to {fileName}")
+	
+	@staticmethod
+	def __patchDMFPtr(file, ptrOfs:int):
+		# points the header field at the current end of the file and moves back there
+		end = file.tell()
+
+		file.seek(ptrOfs, 0)
+		file.write(pack("I", end))
+		file.seek(end, 0)
 
 	def exportTextures(self, 
 		    output:str = getcwd(), 
@@ -1153,6 +1143,7 @@ class Model(Terminable):
 			log.addLevel()
 
 			exported = set()
+			textures = []
 
 			for mat in SafeIter(self, self.materials):
 				mat:MaterialData
@@ -1173,10 +1164,9 @@ class Model(Terminable):
 							continue
 
 						exported.add(texN)
-
-						self.setSubTask(mat)
-						mat.exportTexture(tex, output, forceConvert, texturePaths, texN)
-						self.clearSubTask()
+						textures.append((mat, tex, texN))
+			
+			exportTextureBatch(self, textures, output, forceConvert, texturePaths)
 
 			log.subLevel()
 	
@@ -1186,6 +1176,14 @@ class Model(Terminable):
 	@property
 	def vertCnt(self):
 		return len(self.__vertices)
+	
+	@property
+	def vertices(self) -> np.ndarray:
+		return self.__vertices.array
+	
+	@property
+	def uvs(self) -> np.ndarray:
+		return self.__uvs.array
 
 	@property
 	def skeleton(self):
@@ -1315,9 +1313,9 @@ class GeomNodeTree(RealResData, ModelContainer):
 		# def __next__(self):
 		# 	raise StopIteration()
 		
-		def readMatrix4x4(self, file:BinBlock):
-			flat = unpack("f" * 16, file.read(4 * 16))
+		RECORD_FORMAT = "<16f16fII8xI4xI4x" # tm, wtm, refOfs, refCnt, pnt, nameOfs: 160 bytes
 
+		def readMatrix4x4(self, flat:tuple[float]):
 			m = ( # transpose by hand, faster than a loop
 				(flat[0], flat[4], flat[8], flat[12]),
 				(flat[1], flat[5], flat[9], flat[13]),
@@ -1343,23 +1341,14 @@ class GeomNodeTree(RealResData, ModelContainer):
 			
 			return name.decode("ascii")
 
-		def __init__(self, file:BinBlock, main:BinBlock, idx:int):
-			self.tm = self.readMatrix4x4(file)
-			self.wtm = self.readMatrix4x4(file)
+		def __init__(self, record:tuple, main:BinBlock, idx:int):
+			self.tm = self.readMatrix4x4(record[:16])
+			self.wtm = self.readMatrix4x4(record[16:32])
 
-			self.refOfs = readInt(file)
-			self.refCnt = readInt(file)
+			self.refOfs, self.refCnt, self.pnt, nameOfs = record[32:]
 
 			self.idx = idx
 
-			file.seek(8, 1)
-
-			self.pnt = readInt(file)
-
-			file.seek(4, 1)
-
-			nameOfs = readInt(file)
-
 			ofs = main.tell()
 
 			main.seek(nameOfs + 4, 0)
@@ -1409,7 +1398,8 @@ class GeomNodeTree(RealResData, ModelContainer):
 		nodeCnt = readInt(file)
 
 		# self.__nodes = dict(tuple(tuple((v.name, v) for v in (self.Node(file.readBlock(160), file), ))[0] for i in range(nodeCnt)), )
-		nodes = tuple(self.Node(file.readBlock(160), file, i) for i in SafeRange(self, nodeCnt))
+		records = file.readStructArray(self.Node.RECORD_FORMAT, nodeCnt)
+		nodes = tuple(self.Node(record, file, i) for i, record in zip(SafeRange(self, nodeCnt), records))
 		
 		
 		self.__buildTree__(nodes)
@@ -1811,9 +1801,7 @@ class RendInst(RealResData, ModelContainer):
 				curFace = elem.startI // 3
 
 				obj.appendMaterial(mdl.getMaterialName(elem.mat))
-				
-				for i in SafeRange(self, curFace, curFace + elem.numFace):
-					obj.appendFace(tuple(f + indiceOffset for f in faces[i]))
+				obj.appendFaces(faces[curFace:curFace + elem.numFace] + np.uint32(indiceOffset))
 		
 		return vOfs
 	
@@ -2061,7 +2049,7 @@ class DynModel(RendInst):
 		for i in SafeRange(self, nameCnt):
 			next = nameCnt == i + 1 and -1 or readLong(file) - 0x20
 			
-			nameMap.append(nameMapData[prev:next].decode("utf-8").rstrip("\x00"),)
+			nameMap.append(str(nameMapData[prev:next], "utf-8").rstrip("\x00"),)
 			
 			prev = next
 		
@@ -2289,7 +2277,7 @@ class CollisionGeom(RealResData, ModelContainer):
 	class CollNode(Terminable):
 		def readString(self, file:BinFile):
 			sz = readInt(file)
-			text = file.read(sz).decode()
+			text = str(file.read(sz), "utf-8")
 
 			if sz & 3:
 				file.seek(4 - (sz & 3), 1)
@@ -2335,19 +2323,10 @@ class CollisionGeom(RealResData, ModelContainer):
 			# print("POSOFS", bSphere)
 
 			vCnt = readInt(file)
-			
-			def getVert(v):
-				v = vectorTransform(tm, v)
-				v = (
-					v[0],
-	 				v[2],
-					v[1])
 
-				return v
-
-			self.__verts:tuple[tuple[float, float, float]] = tuple(getVert(unpack("3f", file.read(0xC))) for _ in SafeRange(self, vCnt))
+			self.__verts:np.ndarray = vectorsTransform(tm, file.readArray("<f4", vCnt * 3))[:, (0, 2, 1)]
 			idxCnt = readInt(file) // 3
-			self.__faces:tuple[tuple[int, int, int]] = tuple(unpack("3I", file.read(0xC)) for _ in SafeRange(self, idxCnt))
+			self.__faces:np.ndarray = file.readArray("<u4", idxCnt * 3).reshape(idxCnt, 3)
 
 		def getVerts(self):
 			return self.__verts
@@ -2442,15 +2421,10 @@ class CollisionGeom(RealResData, ModelContainer):
 			
 			verts = node.getVerts()
 
-			mdl.appendVerts(verts, tuple((0, 0) for _ in SafeRange(self, len(verts))))
+			mdl.appendVerts(verts, np.zeros((len(verts), 2)))
 
 			ob.appendMaterial(f"{self.name}_{node.name}_{node.physMat if node.physMat is not None else 'unknown'}")
-
-			for f in SafeIter(self, node.getFaces()):
-				ob.appendFace((
-								f[0] + vOfs,
-		   						f[1] + vOfs,
-		   						f[2] + vOfs))
+			ob.appendFaces(node.getFaces() + np.uint32(vOfs))
 
 			vOfs += len(verts)
 		
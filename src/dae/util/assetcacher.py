@@ -1,9 +1,13 @@
 
+import util.log as log
+from traceback import format_exc
 from util.terminable import Exportable
 
 class AssetCacher:
 	__cachedAssets = {}
 	__modelsDesc = {}
+	__mountedFiles:list[str] = []
+	__modelIndex:dict = None # model name -> first GameResDesc that has it, built on first lookup
 
 	@classmethod
 	def cacheAsset(cls, asset:Exportable):
@@ -27,6 +31,8 @@ class AssetCacher:
 		if asset in cls.__modelsDesc.values():
 			del cls.__modelsDesc[asset.filePath]
 
+			cls.__modelIndex = None
+
 			return
 		
 		assetClass = type(asset)
@@ -48,9 +54,19 @@ class AssetCacher:
 		if assetClass is None:
 			cls.__modelsDesc = {}
 			cls.__cachedAssets = {}
+			cls.__mountedFiles = []
+			cls.__modelIndex = None
 		elif assetClass in cls.__cachedAssets.keys():
 			cls.__cachedAssets.pop(assetClass)
 
+	@classmethod
+	def addMountedFile(cls, filePath:str):
+		cls.__mountedFiles.append(filePath)
+	
+	@classmethod
+	def getMountedFiles(cls) -> list[str]:
+		return list(cls.__mountedFiles)
+
 	@classmethod
 	def getAssetCache(cls, assetClass:type[Exportable] = None):
 		if assetClass == None:
@@ -116,26 +132,67 @@ class AssetCacher:
 
 	@classmethod
 	def appendGameResDesc(cls, desc):
+		if desc.filePath in cls.__modelsDesc:
+			cls.__modelIndex = None
+		
 		cls.__modelsDesc[desc.filePath] = desc
 
+		if cls.__modelIndex is not None and not cls.__indexGameResDesc(cls.__modelIndex, desc):
+			cls.__modelIndex = None
+	
+	@staticmethod
+	def __indexGameResDesc(index:dict, desc):
+		# returns False when the summary was cut short, a desc that can't be read is skipped
+		try:
+			summary = desc.getSummary()
+		except Exception:
+			log.log(f"Couldn't summarize {desc.name}", log.LOG_ERROR)
+			print(format_exc())
+
+			return True
+		
+		for model in summary:
+			index.setdefault(model, desc)
+		
+		return not desc.shouldTerminate
+
+	@classmethod
+	def getModelDesc(cls, model:str):
+		if cls.__modelIndex is None:
+			index = {}
+			complete = True
+
+			for desc in tuple(cls.__modelsDesc.values()):
+				complete = cls.__indexGameResDesc(index, desc) and complete
+			
+			if not complete: # rebuilt by the next lookup
+				return index.get(model)
+			
+			cls.__modelIndex = index
+		
+		return cls.__modelIndex.get(model)
+
 	@classmethod
 	def getModelTextures(cls, model:str) -> list[str]:
-		for desc in cls.__modelsDesc.values():
-			if desc.hasName(model):
-				return desc.getModelTextures(model)
-	
-		return []
+		desc = cls.getModelDesc(model)
+
+		if desc is None:
+			return []
+		
+		return desc.getModelTextures(model)
 
 	@classmethod
 	def getModelMaterials(cls, model:str) -> list[str]:
-		for desc in cls.__modelsDesc.values():
-			if desc.hasName(model):
-				return desc.getModelMaterials(model)
+		desc = cls.getModelDesc(model)
+
+		if desc is not None:
+			return desc.getModelMaterials(model)
 
 	@classmethod
 	def getSkinnedMaterials(cls, model:str) -> list[str]:
-		for desc in cls.__modelsDesc.values():
-			if desc.hasName(model):
-				return desc.getSkinnedMaterials(model)
-	
-		return []
\ No newline at end of file
+		desc = cls.getModelDesc(model)
+
+		if desc is None:
+			return []
+		
+		return desc.getSkinnedMaterials(model)
\ No newline at end of file
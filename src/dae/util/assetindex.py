@@ -0,0 +1,165 @@
+import sys
+from os import path, stat
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import util.log as log
+import sqlite3
+from marshal import dumps, loads
+from threading import Lock
+from util.misc import ROOT_FOLDER
+from util.enums import *
+
+ASSET_INDEX_PATH = path.join(ROOT_FOLDER, "assetindex.db")
+ASSET_INDEX_VERSION = 2 # bump whenever the layout of a stored table changes
+
+class AssetIndex:
+	# persistent (path, kind) -> marshalled table store, an entry is only returned while the file keeps the size and mtime it was stored with
+	__connection:sqlite3.Connection = None
+	__disabled = False
+	__lock = Lock()
+
+	@classmethod
+	def __getConnection(cls):
+		if cls.__connection is None and not cls.__disabled:
+			try:
+				connection = sqlite3.connect(ASSET_INDEX_PATH, timeout = 30, check_same_thread = False)
+				connection.execute("PRAGMA journal_mode = WAL")
+				connection.execute("PRAGMA synchronous = NORMAL")
+				connection.execute("""CREATE TABLE IF NOT EXISTS entries (
+							path TEXT NOT NULL,
+							kind TEXT NOT NULL,
+							size INTEGER NOT NULL,
+							mtime INTEGER NOT NULL,
+							version INTEGER NOT NULL,
+							data BLOB NOT NULL,
+							PRIMARY KEY (path, kind))""")
+				connection.execute("""CREATE TABLE IF NOT EXISTS textures (
+							name TEXT NOT NULL,
+							path TEXT NOT NULL,
+							record INTEGER NOT NULL,
+							offset INTEGER NOT NULL,
+							header BLOB NOT NULL,
+							size INTEGER NOT NULL,
+							mtime INTEGER NOT NULL,
+							PRIMARY KEY (path, record))""")
+				connection.execute("CREATE INDEX IF NOT EXISTS texturesByName ON textures (name)")
+				connection.commit()
+
+				cls.__connection = connection
+			except sqlite3.Error as e:
+				log.log(f"Asset index disabled: {e}", LOG_WARN)
+
+				cls.__disabled = True
+
+		return cls.__connection
+
+	@staticmethod
+	def __getFileKey(filePath:str):
+		st = stat(filePath)
+
+		return path.normcase(path.abspath(filePath)), st.st_size, st.st_mtime_ns
+
+	@classmethod
+	def load(cls, filePath:str, kind:str):
+		with cls.__lock:
+			connection = cls.__getConnection()
+
+			if connection is None:
+				return None
+
+			filePath, size, mtime = cls.__getFileKey(filePath)
+
+			try:
+				row = connection.execute("SELECT data FROM entries WHERE path = ? AND kind = ? AND size = ? AND mtime = ? AND version = ?",
+							 (filePath, kind, size, mtime, ASSET_INDEX_VERSION)).fetchone()
+
+				if row is None:
+					return None
+
+				return loads(row[0])
+			except (sqlite3.Error, ValueError, EOFError, TypeError) as e:
+				log.log(f"Bad asset index entry for {filePath}:{kind}: {e}", LOG_WARN)
+
+				return None
+
+	@classmethod
+	def store(cls, filePath:str, kind:str, data):
+		with cls.__lock:
+			connection = cls.__getConnection()
+
+			if connection is None:
+				return
+
+			filePath, size, mtime = cls.__getFileKey(filePath)
+
+			try:
+				connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+						   (filePath, kind, size, mtime, ASSET_INDEX_VERSION, dumps(data)))
+				connection.commit()
+			except sqlite3.Error as e:
+				log.log(f"Couldn't index {filePath}:{kind}: {e}", LOG_WARN)
+
+	@classmethod
+	def loadOrBuild(cls, filePath:str, kind:str, buildFunc, shouldStore = lambda: True):
+		data = cls.load(filePath, kind)
+
+		if data is None:
+			data = buildFunc()
+
+			if shouldStore():
+				cls.store(filePath, kind, data)
+		else:
+			log.log(f"Loaded {path.basename(filePath)} from the asset index")
+
+		return data
+
+	@classmethod
+	def registerTextures(cls, filePath:str, records:list[tuple[str, int, int, bytes]]):
+		# records are (texture name, record index, data offset, raw DDSx header), replaces whatever the pack registered before
+		with cls.__lock:
+			connection = cls.__getConnection()
+
+			if connection is None:
+				return
+
+			filePath, size, mtime = cls.__getFileKey(filePath)
+
+			try:
+				connection.execute("DELETE FROM textures WHERE path = ?", (filePath,))
+				connection.executemany("INSERT OR REPLACE INTO textures VALUES (?, ?, ?, ?, ?, ?, ?)",
+						       ((name, filePath, record, offset, header, size, mtime) for name, record, offset, header in records))
+				connection.commit()
+			except sqlite3.Error as e:
+				log.log(f"Couldn't index the textures of {filePath}: {e}", LOG_WARN)
+
+	@classmethod
+	def findTextures(cls, name:str) -> list[tuple[str, int, int, bytes]]:
+		# (pack path, record index, data offset, raw DDSx header) of every indexed texture called name whose pack didn't change since
+		with cls.__lock:
+			connection = cls.__getConnection()
+
+			if connection is None:
+				return []
+
+			try:
+				rows = connection.execute("SELECT path, record, offset, header, size, mtime FROM textures WHERE name = ?", (name,)).fetchall()
+			except sqlite3.Error as e:
+				log.log(f"Couldn't look {name} up in the asset index: {e}", LOG_WARN)
+
+				return []
+
+		textures = []
+		fileKeys = {}
+
+		for filePath, record, offset, header, size, mtime in rows:
+			if not filePath in fileKeys:
+				try:
+					fileKeys[filePath] = cls.__getFileKey(filePath)[1:]
+				except OSError:
+					fileKeys[filePath] = None
+
+			if fileKeys[filePath] == (size, mtime):
+				textures.append((filePath, record, offset, header))
+
+		return textures
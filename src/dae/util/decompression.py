@@ -4,45 +4,109 @@ from os import path
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
 import util.log as log
-from ctypes import create_string_buffer, c_void_p, c_int64, c_int, c_size_t
+from ctypes import create_string_buffer, c_void_p, c_int64, c_int, c_size_t, c_char, addressof
 from os import path
 from zlib import decompress as zlibdecompress
 from zlib import compress as zlibcompress
-from pylzma import decompress as lzmadecompress
-from pylzma import compress as lzmacompress
+from zlib import decompressobj as zlibdecompressobj
+from threading import local
+import lzma as stdlzma
+
+try:
+	from pylzma import decompress as lzmadecompress
+	from pylzma import compress as lzmacompress
+	from pylzma import decompressobj as lzmadecompressobj
+except ImportError: # the stdlib lzma module reads and writes the same streams
+	lzmadecompress = lzmacompress = lzmadecompressobj = None
+
+try:
+	from zstandard import ZstdDecompressor, ZstdCompressor
+except ImportError: # falls back to daKernel-dev.dll
+	ZstdDecompressor = ZstdCompressor = None
 from util.misc import loadDLL
 from struct import pack
 from util.fileread import *
+from util.lrucache import LRUCache
+from util.enums import DECOMPRESSED_CACHE_SIZE, STREAM_CHUNK_SIZE
 
-dakernel = loadDLL("daKernel-dev.dll")
+class CodecUnavailableError(Exception): ...
 
-if dakernel == None:
-	print("Failed to load daKernel-dev.dll")
-else:
-	# size_t __fastcall oodle_compress(void *dst, unsigned __int64 maxDstSize, const void *src, unsigned __int64 srcSize, int compressionLevel)
+_dakernel = None
 
-	oodle_compress = dakernel[572]
-	oodle_compress.argtypes = c_void_p, c_int64, c_void_p, c_int64, c_int
-	oodle_compress.restype  = c_size_t
+def getDaKernel():
+	# daKernel-dev.dll only exists on Windows installs, it is loaded the first time a codec needs it
+	global _dakernel, oodle_compress, oodle_decompress, zstd_compress, zstd_decompress
 
-	# __int64 __fastcall oodle_decompress(void *dst, unsigned __int64 maxOriginalSize, const void *src, unsigned __int64 compressedSize)
+	if _dakernel is None:
+		try:
+			dakernel = loadDLL("daKernel-dev.dll")
+		except OSError as e: # the DLL ships with the repo, other platforms can't load it
+			log.log(f"Couldn't load daKernel-dev.dll: {e}", log.LOG_WARN)
 
-	oodle_decompress = dakernel[574]
-	oodle_decompress.argtypes = c_void_p, c_int64, c_void_p, c_int64
-	oodle_decompress.restype  = c_int64
+			dakernel = None
 
-	# unsigned __int64 __fastcall zstd_compress(void *dst, unsigned __int64 maxDstSize, const void *src, unsigned __int64 srcSize, int compressionLevel)
+		if dakernel == None:
+			log.log("daKernel-dev.dll isn't available, oodle is disabled", log.LOG_WARN)
 
-	zstd_compress = dakernel[954]
-	zstd_compress.argtypes = c_void_p, c_int64, c_void_p, c_int64, c_int
-	zstd_compress.restype  = c_int64
+			_dakernel = False
+		else:
+			# size_t __fastcall oodle_compress(void *dst, unsigned __int64 maxDstSize, const void *src, unsigned __int64 srcSize, int compressionLevel)
+
+			oodle_compress = dakernel[572]
+			oodle_compress.argtypes = c_void_p, c_int64, c_void_p, c_int64, c_int
+			oodle_compress.restype  = c_size_t
+
+			# __int64 __fastcall oodle_decompress(void *dst, unsigned __int64 maxOriginalSize, const void *src, unsigned __int64 compressedSize)
+
+			oodle_decompress = dakernel[574]
+			oodle_decompress.argtypes = c_void_p, c_int64, c_void_p, c_int64
+			oodle_decompress.restype  = c_int64
+
+			# unsigned __int64 __fastcall zstd_compress(void *dst, unsigned __int64 maxDstSize, const void *src, unsigned __int64 srcSize, int compressionLevel)
 
-	# unsigned __int64 __fastcall zstd_decompress(void *dst, unsigned __int64 maxOriginalSize, const void *src, unsigned __int64 srcSize)
+			zstd_compress = dakernel[954]
+			zstd_compress.argtypes = c_void_p, c_int64, c_void_p, c_int64, c_int
+			zstd_compress.restype  = c_int64
+
+			# unsigned __int64 __fastcall zstd_decompress(void *dst, unsigned __int64 maxOriginalSize, const void *src, unsigned __int64 srcSize)
+
+			zstd_decompress = dakernel[962]
+			zstd_decompress.argtypes = c_void_p, c_int64, c_void_p, c_int64
+			zstd_decompress.restype  = c_int64
+
+			_dakernel = dakernel
+	
+	return _dakernel or None
+
+def requireDaKernel(codec:str):
+	if getDaKernel() is None:
+		raise CodecUnavailableError(f"{codec} needs daKernel-dev.dll")
+
+
+DECOMPRESSED_CACHE = LRUCache(DECOMPRESSED_CACHE_SIZE) # process wide, see getBlockKey
+
+def getBlockKey(file:BinFile, size:int):
+	# identifies the payload of size bytes at the current position of a file opened from a path
+	filePath = file.getFilePath()
+
+	if filePath is None:
+		return None
+	
+	return (filePath, file.absTell(), size, file.getMTime())
+
+def cachedDecompress(key, decompressFunc, *args):
+	if key is None:
+		return decompressFunc(*args)
+	
+	data = DECOMPRESSED_CACHE.get(key)
 
-	zstd_decompress = dakernel[962]
-	zstd_decompress.argtypes = c_void_p, c_int64, c_void_p, c_int64
-	zstd_decompress.restype  = c_int64
+	if data is None:
+		data = decompressFunc(*args)
 
+		if isinstance(data, bytes): # stored blocks come back as views of the source
+			DECOMPRESSED_CACHE.put(key, data, len(data))
+	
+	return data
 
 class CompressedData:
 	def __init__(self, file:BinFile, cMethod:int = None):
@@ -50,24 +114,40 @@ class CompressedData:
 			self.cSz = len(file)
 			self.cMethod = cMethod
 			self.cData = file
+			self.key = None
 		else:
 			self.cSz = readEx(3, file)
 			self.cMethod = readByte(file)
+			self.key = getBlockKey(file, self.cSz)
 			self.cData = file.read(self.cSz)
 	
+	def decompressTo(self, sink):
+		# streams the decompressed payload to sink (anything with a write method, or a callable), returns the amount of bytes written
+		data = DECOMPRESSED_CACHE.get(self.key) if self.key is not None else None
+
+		if data is not None:
+			return writeChunks(data, sink)
+		
+		return decompressStream(self.cMethod, self.cData, sink)
+	
+	def dump(self, outName:str):
+		# writes the payload to outName unless it already exists, without ever holding all of it in memory
+		if path.exists(outName):
+			return False
+		
+		file = open(outName, "wb")
+
+		try:
+			size = self.decompressTo(file)
+		finally:
+			file.close()
+		
+		log.log(f"Wrote {size} bytes to {outName}")
+
+		return True
+	
 	def decompress(self, outName:str = None):
-		data = None
-
-		if self.cMethod == 0x40:
-			data = zstdDecompress(self.cData)
-		elif self.cMethod == 0x60:
-			data = zlibDecompress(self.cData)
-		elif self.cMethod == 0x20:
-			data = lzmaDecompress(self.cData)
-		elif self.cMethod == 0x80:
-			data = oodleDecompress(self.cData)
-		else:
-			log.log(f"Unknown compression method {hex(self.cMethod)}", log.LOG_ERROR)
+		data = cachedDecompress(self.key, self.__decompress__)
 			
 		if outName is not None and not path.exists(outName):
 			if data != None:
@@ -79,6 +159,14 @@ class CompressedData:
 		
 		return data
 	
+	def __decompress__(self):
+		if not self.cMethod in CONTAINER_METHODS:
+			log.log(f"Unknown compression method {hex(self.cMethod)}", log.LOG_ERROR)
+
+			return None
+		
+		return getContainerCodec(self.cMethod).decompress(self.cData)
+	
 	def decompressToBin(self):
 		d = self.decompress()
 		
@@ -88,31 +176,21 @@ class CompressedData:
 			return BinFile(d)
 
 def compressBlock(data:bytes, cMethod:int, level:int = None):
-	if cMethod == 0x40:
-		if level:
-			cData = zstdCompress(data, level)
-		else:
-			cData = zstdCompress(data)
-	elif cMethod == 0x60:
-		cData = zlibCompress(data)
-	elif cMethod == 0x20:
-		cData = lzmaCompress(data)
-	elif cMethod == 0x80:
-		if level:
-			cData = oodleCompress(data, level)
-		else:
-			cData = oodleCompress(data)
-	else:
-		raise ValueError(f"Unknown compression method {hex(cMethod)}")
+	cData = getContainerCodec(cMethod).compress(data, level)
 	
 	return pack("<L", len(cData))[:3] + pack("<B", cMethod)[:1] + cData
 
 
 def oodleDecompress(src:bytes, maxOriginalSize:int = None):
+	requireDaKernel("oodle")
+
 	if not maxOriginalSize:
 		maxOriginalSize = toInt(src[:4])
 		src = src[4:]
 	
+	if isinstance(src, memoryview): # ctypes can't take a pointer to a read-only buffer
+		src = src.tobytes()
+	
 	compressedSize = len(src)
 	dst = create_string_buffer(maxOriginalSize)
 
@@ -123,6 +201,22 @@ def oodleDecompress(src:bytes, maxOriginalSize:int = None):
 	
 	return dst.raw
 
+def oodleDecompressInto(src:bytes, dst):
+	# dst has to be a writable buffer, it is sized for the payload of src
+	requireDaKernel("oodle")
+
+	dst = memoryview(dst).cast("B")
+
+	if isinstance(src, memoryview):
+		src = src.tobytes()
+	
+	result = oodle_decompress(addressof((c_char * len(dst)).from_buffer(dst)), len(dst), src, len(src))
+
+	if result == 0:
+		raise Exception(f"Oodle error")
+	
+	return result
+
 def oodleCompress(src:bytes, compressionLevel:int = 0x4):
 	# enum oo2::OodleLZ_CompressionLevel, copyof_254, signed, width 4 bytes
 	# 	OodleLZ_CompressionLevel_None  = 0
@@ -150,6 +244,8 @@ def oodleCompress(src:bytes, compressionLevel:int = 0x4):
 	# NOTE : compressor = (compressionLevel / 10 > 0) ? OodleLZ_Compressor_Leviathan : OodleLZ_Compressor_Kraken
 	# NOTE : OodleLZLevel = compressionLevel % 10 (actual compression level)
 
+	requireDaKernel("oodle")
+
 	srcSize = len(src)
 	maxDstSize = srcSize + 274 * ((srcSize + 0x3FFFF) // 0x40000) # OodleLZ_GetCompressedBufferSizeNeeded(srcSize)
 	dst = create_string_buffer(maxDstSize)
@@ -162,9 +258,14 @@ def oodleCompress(src:bytes, compressionLevel:int = 0x4):
 	return pack("I", srcSize) + dst.raw[:result]
 
 def zstdDecompressTest(src:bytes, maxOriginalSize:int = None):
+	requireDaKernel("zstd")
+
 	if not maxOriginalSize:
 		maxOriginalSize = toInt(src[5:8])
 	
+	if isinstance(src, memoryview):
+		src = src.tobytes()
+	
 	compressedSize = len(src)
 	dst = create_string_buffer(maxOriginalSize)
 
@@ -175,6 +276,11 @@ def zstdDecompressTest(src:bytes, maxOriginalSize:int = None):
 	return dst.raw
 
 def zstdCompress(src:bytes, compressionLevel:int = 18):
+	if ZstdCompressor is not None:
+		return ZstdCompressor(level = compressionLevel, threads = -1).compress(src)
+	
+	requireDaKernel("zstd")
+
 	srcSize = len(src)
 	maxDstSize = srcSize
 	dst = create_string_buffer(maxDstSize)
@@ -186,20 +292,295 @@ def zstdCompress(src:bytes, compressionLevel:int = 18):
 	
 	return dst.raw[:result]
 
-from zstandard import ZstdDecompressor
+_zstdContexts = local() # decompressors aren't thread safe, each thread reuses its own
+
+def getZstdDecompressor() -> ZstdDecompressor:
+	dctx = getattr(_zstdContexts, "dctx", None)
+
+	if dctx is None:
+		dctx = _zstdContexts.dctx = ZstdDecompressor()
+	
+	return dctx
 
 def zstdDecompress(src:bytes, maxOriginalSize:int = None):
-	return ZstdDecompressor().decompress(src)
+	if ZstdDecompressor is None:
+		return zstdDecompressTest(src, maxOriginalSize)
+	
+	return getZstdDecompressor().decompress(src)
 
 
-def zlibDecompress(data:bytes):
+def zlibDecompress(data:bytes, maxOriginalSize:int = None):
 	return zlibdecompress(data)
 
 def zlibCompress(data:bytes):
 	return zlibcompress(data)
 
-def lzmaDecompress(data:bytes):
+# pylzma streams are 5 bytes of LZMA properties followed by raw LZMA1 data, which the stdlib can read and write too
+
+LZMA_PROPS_SIZE = 5
+LZMA_DICT_SIZE = 1 << 23 # pylzma's default
+
+def getStdLzmaFilters(props:bytes):
+	props = bytes(props[:LZMA_PROPS_SIZE])
+	pb, rem = divmod(props[0], 45)
+	lp, lc = divmod(rem, 9)
+
+	return [{"id":stdlzma.FILTER_LZMA1, "dict_size":toInt(props[1:5]), "lc":lc, "lp":lp, "pb":pb}]
+
+def getStdLzmaDecompressor(props:bytes):
+	return stdlzma.LZMADecompressor(stdlzma.FORMAT_RAW, filters = getStdLzmaFilters(props))
+
+def lzmaDecompress(data:bytes, maxOriginalSize:int = None):
+	if lzmadecompress is None:
+		return getStdLzmaDecompressor(data).decompress(data[LZMA_PROPS_SIZE:])
+	
+	if isinstance(data, memoryview): # pylzma only takes bytes
+		data = data.tobytes()
+	
 	return lzmadecompress(data)
 
 def lzmaCompress(data:bytes):
+	if lzmacompress is None:
+		lc, lp, pb = 3, 0, 2
+		props = pack("<BI", (pb * 5 + lp) * 9 + lc, LZMA_DICT_SIZE)
+		compressor = stdlzma.LZMACompressor(stdlzma.FORMAT_RAW, filters = getStdLzmaFilters(props))
+
+		return props + compressor.compress(data) + compressor.flush()
+	
 	return lzmacompress(data)
+
+
+def getWriteFunc(sink):
+	return sink.write if hasattr(sink, "write") else sink
+
+def writeChunks(data:bytes, sink, chunkSize:int = STREAM_CHUNK_SIZE):
+	write = getWriteFunc(sink)
+	data = memoryview(data)
+
+	for ofs in range(0, len(data), chunkSize):
+		write(data[ofs:ofs + chunkSize])
+	
+	return len(data)
+
+
+def zstdDecompressStream(src:bytes, sink, chunkSize:int = STREAM_CHUNK_SIZE):
+	if ZstdDecompressor is None:
+		return writeChunks(zstdDecompress(src), sink, chunkSize)
+	
+	write = getWriteFunc(sink)
+	size = 0
+
+	with getZstdDecompressor().stream_reader(src, read_size = chunkSize, closefd = False) as reader:
+		while True:
+			chunk = reader.read(chunkSize)
+
+			if not chunk:
+				break
+
+			write(chunk)
+			size += len(chunk)
+	
+	return size
+
+def zlibDecompressStream(src:bytes, sink, chunkSize:int = STREAM_CHUNK_SIZE):
+	write = getWriteFunc(sink)
+	src = memoryview(src)
+	dobj = zlibdecompressobj()
+	size = 0
+
+	for ofs in range(0, len(src), chunkSize):
+		chunk = dobj.decompress(src[ofs:ofs + chunkSize], chunkSize)
+
+		while chunk:
+			write(chunk)
+			size += len(chunk)
+
+			chunk = dobj.decompress(dobj.unconsumed_tail, chunkSize) if dobj.unconsumed_tail else None
+	
+	chunk = dobj.flush()
+
+	if chunk:
+		write(chunk)
+		size += len(chunk)
+	
+	return size
+
+def lzmaDecompressStream(src:bytes, sink, chunkSize:int = STREAM_CHUNK_SIZE):
+	if lzmadecompressobj is None:
+		return stdLzmaDecompressStream(src, sink, chunkSize)
+	
+	write = getWriteFunc(sink)
+	src = memoryview(src)
+	dobj = lzmadecompressobj()
+	size = 0
+
+	for ofs in range(0, len(src), chunkSize):
+		chunk = dobj.decompress(src[ofs:ofs + chunkSize].tobytes(), chunkSize) # pylzma only takes bytes
+
+		while chunk:
+			write(chunk)
+			size += len(chunk)
+
+			chunk = dobj.decompress(b"", chunkSize) # whatever didn't fit is kept in its buffers
+	
+	chunk = dobj.flush()
+
+	if chunk:
+		write(chunk)
+		size += len(chunk)
+	
+	return size
+
+def stdLzmaDecompressStream(src:bytes, sink, chunkSize:int = STREAM_CHUNK_SIZE):
+	write = getWriteFunc(sink)
+	src = memoryview(src)
+	dobj = getStdLzmaDecompressor(src)
+	size = 0
+
+	for ofs in range(LZMA_PROPS_SIZE, len(src), chunkSize):
+		chunk = dobj.decompress(src[ofs:ofs + chunkSize], chunkSize)
+
+		while chunk:
+			write(chunk)
+			size += len(chunk)
+
+			chunk = dobj.decompress(b"", chunkSize) if not dobj.needs_input and not dobj.eof else None
+	
+	return size
+
+def oodleDecompressStream(src:bytes, sink, chunkSize:int = STREAM_CHUNK_SIZE):
+	# oodle has no streaming interface, blocks are decompressed whole
+	return writeChunks(oodleDecompress(src), sink, chunkSize)
+
+def decompressStream(cMethod:int, src:bytes, sink, chunkSize:int = STREAM_CHUNK_SIZE):
+	# cMethod is a CompressedData method
+	return getContainerCodec(cMethod).decompressStream(src, sink, chunkSize)
+
+
+class BufferSink:
+	# decompression sink writing into a preallocated buffer, such as a bytearray or an mmap slice
+	def __init__(self, dst):
+		self.__dst = memoryview(dst).cast("B")
+		self.__pos = 0
+	
+	def write(self, data:bytes):
+		end = self.__pos + len(data)
+
+		if end > len(self.__dst):
+			raise ValueError(f"Decompressed data overflows its {len(self.__dst)} bytes buffer")
+		
+		self.__dst[self.__pos:end] = data
+		self.__pos = end
+	
+	@property
+	def size(self):
+		return self.__pos
+
+def copyInto(src:bytes, dst):
+	return writeChunks(src, BufferSink(dst))
+
+def zstdDecompressInto(src:bytes, dst):
+	if ZstdDecompressor is None:
+		return copyInto(zstdDecompress(src, len(dst)), dst)
+	
+	dst = memoryview(dst).cast("B")
+	size = 0
+
+	with getZstdDecompressor().stream_reader(src, closefd = False) as reader:
+		while size < len(dst):
+			read = reader.readinto(dst[size:])
+
+			if not read:
+				break
+
+			size += read
+		
+		if size == len(dst) and reader.read(1):
+			raise ValueError(f"Decompressed data overflows its {len(dst)} bytes buffer")
+	
+	return size
+
+def zlibDecompressInto(src:bytes, dst):
+	return zlibDecompressStream(src, BufferSink(dst))
+
+def lzmaDecompressInto(src:bytes, dst):
+	return lzmaDecompressStream(src, BufferSink(dst))
+
+
+class Codec:
+	# one compression method, getBackend names the implementation that is used on this host or returns None when there is none
+	def __init__(self, name:str, getBackend, decompress, decompressInto, decompressStream, compress, hasLevels:bool = False):
+		self.name = name
+		self.decompress = decompress # (src, maxOriginalSize = None)
+		self.decompressInto = decompressInto # (src, dst)
+		self.decompressStream = decompressStream # (src, sink, chunkSize)
+		self.__compress = compress
+		self.__getBackend = getBackend
+		self.__hasLevels = hasLevels
+	
+	def __repr__(self):
+		return f"<Codec {self.name}: {self.backend}>"
+	
+	@property
+	def backend(self) -> str:
+		return self.__getBackend()
+	
+	@property
+	def available(self):
+		return self.backend is not None
+	
+	def compress(self, data:bytes, level:int = None):
+		if level and self.__hasLevels:
+			return self.__compress(data, level)
+		else:
+			return self.__compress(data)
+
+CODECS:dict[str, Codec] = {}
+
+def registerCodec(codec:Codec):
+	CODECS[codec.name] = codec
+
+registerCodec(Codec("zstd",
+		    lambda: "zstandard" if ZstdDecompressor is not None else ("daKernel" if getDaKernel() else None),
+		    zstdDecompress, zstdDecompressInto, zstdDecompressStream, zstdCompress, True))
+registerCodec(Codec("zlib",
+		    lambda: "zlib",
+		    zlibDecompress, zlibDecompressInto, zlibDecompressStream, zlibCompress))
+registerCodec(Codec("lzma",
+		    lambda: "pylzma" if lzmadecompress is not None else "lzma",
+		    lzmaDecompress, lzmaDecompressInto, lzmaDecompressStream, lzmaCompress))
+registerCodec(Codec("oodle",
+		    lambda: "daKernel" if getDaKernel() else None,
+		    oodleDecompress, oodleDecompressInto, oodleDecompressStream, oodleCompress, True))
+
+# the same codecs go by different method IDs in CompressedData blocks and DDSx headers
+
+CONTAINER_METHODS = {0x20:"lzma", 0x40:"zstd", 0x60:"zlib", 0x80:"oodle"}
+DDSX_METHODS = {0x20:"zstd", 0x40:"lzma", 0x60:"oodle", 0x80:"zlib"}
+
+def getCodec(name:str) -> Codec:
+	codec = CODECS.get(name)
+
+	if codec is None:
+		raise ValueError(f"Unknown codec {name}")
+	
+	if not codec.available:
+		raise CodecUnavailableError(f"No {name} backend available on this host")
+	
+	return codec
+
+def getContainerCodec(cMethod:int) -> Codec:
+	if not cMethod in CONTAINER_METHODS:
+		raise ValueError(f"Unknown compression method {hex(cMethod)}")
+	
+	return getCodec(CONTAINER_METHODS[cMethod])
+
+def getDDSxCodec(cMethod:int) -> Codec:
+	if not cMethod in DDSX_METHODS:
+		raise ValueError(f"Unknown DDSx compression method {hex(cMethod)}")
+	
+	return getCodec(DDSX_METHODS[cMethod])
+
+def getSupportedCodecs() -> dict[str, str]:
+	# codec name -> backend, for every codec this host can decompress
+	return {k:v.backend for k, v in CODECS.items() if v.available}
@@ -57,6 +57,8 @@ SETTINGS_NO_MDL = "NO_MDL"
 SETTINGS_DONT_EXPORT_EXISTING_TEXTURES = "DONT_EXPORT_EXISTING_TEXTURES"
 SETTINGS_FORCE_DDS_CONVERSION = "FORCE_DDS_CONVERSION"
 SETTINGS_EXPAND_ALL = "EXPAND_ALL"
+SETTINGS_DECOMPRESSED_CACHE_SIZE = "DECOMPRESSED_CACHE_SIZE"
+SETTINGS_FILE_POOL_SIZE = "FILE_POOL_SIZE"
 
 TEXTURE_GENERIC = 0
 TEXTURE_NORMAL = 1
@@ -64,4 +66,17 @@ TEXTURE_MASKED = 2
 
 MVD_NORMAL = 0
 MVD_SKINNED = 1
-MVD_SKINNED_FLAG = 2
\ No newline at end of file
+MVD_SKINNED_FLAG = 2
+MVD_VDATA_CACHE_SIZE = 0x4000000 # decoded vertex data kept per MatVData, in bytes
+DECOMPRESSED_CACHE_SIZE = 0x20000000 # default budget of the process wide decompressed block cache, in bytes
+TEXTURE_PIPELINE_BUDGET = 0x10000000 # decompressed texture bytes the texture pipeline keeps in flight
+STREAM_CHUNK_SIZE = 0x100000 # chunk size of streamed decompression, in bytes
+FILE_POOL_SIZE = 64 # default amount of pack files the process wide file pool keeps mapped
+
+ASSET_INDEX_GRP = "grp"
+ASSET_INDEX_DXP = "dxp"
+ASSET_INDEX_DESC = "desc"
+
+DESC_MATERIAL_BLOCKS = ("matR", "mat", "matS")
+
+EXPORT_POOL_MIN_JOBS = 16 # smaller batches run inline, spawning and mounting in every worker costs more than it saves
@@ -0,0 +1,179 @@
+import sys
+from os import path, cpu_count
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import util.log as log
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from threading import Thread
+from traceback import format_exc
+from util.terminable import Terminable, Pack, Packed
+from util.assetcacher import AssetCacher
+
+# worker side state, only ever set inside pool processes
+
+_cancelEvent = None
+_current:Terminable = None
+_packs:dict[str, Pack] = {}
+
+def _watchCancel():
+	_cancelEvent.wait()
+
+	if _current is not None:
+		_current.terminate()
+
+def _cacheAsset(asset, cachedClasses:tuple):
+	if isinstance(asset, cachedClasses):
+		AssetCacher.cacheAsset(asset)
+
+def _mountFile(filePath:str, cachedClasses:tuple):
+	# mirrors MainWindow.exploreFileInfo so that models find their textures and skeletons
+	from parse.gameres import GameResDesc
+	from util.assetmanager import AssetManager
+
+	if filePath[-8:] == "Desc.bin":
+		desc = GameResDesc(filePath) # the summary loads on first use
+
+		AssetCacher.appendGameResDesc(desc)
+
+		return
+
+	asset = AssetManager.initializeAsset(filePath, path.basename(filePath).split(".", 1)[-1])
+
+	if asset is None or not asset.valid:
+		return
+
+	_cacheAsset(asset, cachedClasses)
+
+	if isinstance(asset, Pack):
+		_packs[filePath] = asset
+
+		for v in asset.getPackedFiles():
+			_cacheAsset(v, cachedClasses)
+
+def _initWorker(mountedFiles:list[str], cachedClasses:tuple, cancelEvent):
+	global _cancelEvent
+
+	_cancelEvent = cancelEvent
+
+	Thread(target = _watchCancel, daemon = True).start()
+
+	for filePath in mountedFiles:
+		if _cancelEvent.is_set():
+			break
+
+		try:
+			_mountFile(filePath, cachedClasses)
+		except Exception:
+			log.log(f"Couldn't mount '{filePath}' in export worker", log.LOG_ERROR)
+			print(format_exc())
+
+def _getPack(packClass:type[Pack], filePath:str) -> Pack:
+	pack = _packs.get(filePath)
+
+	if pack is None:
+		pack = _packs[filePath] = packClass(filePath)
+
+	return pack
+
+def _setCurrent(ter:Terminable):
+	global _current
+
+	_current = ter
+
+	if ter is not None and _cancelEvent.is_set():
+		ter.terminate()
+
+def _runJob(packClass:type[Pack], packPath:str, assetIdx:int, task, args:tuple):
+	if _cancelEvent.is_set():
+		return None
+
+	asset = _getPack(packClass, packPath).getPackedFiles()[assetIdx]
+	level = log.curLevel
+
+	try:
+		_setCurrent(asset)
+		task(asset, *args)
+
+		return None
+	except Exception:
+		log.subLevel(log.curLevel - level)
+
+		return format_exc()
+	finally:
+		_setCurrent(None)
+
+# tasks, these have to be module level functions so that they can be pickled
+
+def saveTask(asset:Packed, output:str):
+	asset.save(output)
+
+def exportDDSTask(asset, output:str):
+	asset.exportDDS(output)
+
+def exportModelTask(asset, output:str, lod:int, exportMethodName:str, exportTex:bool, forceConvert:bool):
+	mdl = asset.getModel(lod)
+
+	_setCurrent(mdl)
+
+	if not mdl.shouldTerminate:
+		getattr(mdl, exportMethodName)(output, exportTex, forceConvert)
+
+
+class ExportEngine(Terminable):
+	def __init__(self, mountedFiles:list[str], cachedClasses:tuple, workers:int = None):
+		self.__mountedFiles = mountedFiles
+		self.__cachedClasses = cachedClasses
+		self.__workers = workers if workers is not None else (cpu_count() or 1)
+		self.__context = get_context("spawn") # forking a process that runs Qt threads isn't safe
+		self.__cancelEvent = self.__context.Event()
+		self.__futures = []
+
+	@property
+	def workers(self):
+		return self.__workers
+
+	def terminate(self):
+		super().terminate()
+
+		self.__cancelEvent.set()
+
+		for future in self.__futures:
+			future.cancel()
+
+	def run(self, pack:Pack, jobs:list[tuple[int, object, tuple]]):
+		# jobs are (index of the asset in pack.getPackedFiles(), task, task args), yields (job index, error traceback or None) as they finish
+		log.log(f"Spreading {len(jobs)} jobs over {self.__workers} processes")
+
+		pool = ProcessPoolExecutor(min(self.__workers, len(jobs)),
+			mp_context = self.__context,
+			initializer = _initWorker,
+			initargs = (self.__mountedFiles, self.__cachedClasses, self.__cancelEvent))
+
+		try:
+			futures = {}
+
+			for k, (assetIdx, task, args) in enumerate(jobs):
+				future = pool.submit(_runJob, type(pack), pack.filePath, assetIdx, task, args)
+				futures[future] = k
+
+			self.__futures = list(futures)
+
+			for future in as_completed(futures):
+				if future.cancelled():
+					continue
+
+				try:
+					error = future.result()
+				except Exception: # the worker died (BrokenProcessPool), only this job is lost
+					error = format_exc()
+
+				yield futures[future], error
+
+				if self.shouldTerminate:
+					break
+		finally:
+			self.__futures = []
+
+			pool.shutdown(wait = True, cancel_futures = True)
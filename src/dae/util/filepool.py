@@ -0,0 +1,85 @@
+import sys
+from os import path
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from collections import OrderedDict
+from threading import Lock
+from util.fileread import BinFile, BinBlock
+from util.enums import FILE_POOL_SIZE
+
+class FilePool:
+	# mapped BinFiles shared by path, callers only get BinBlocks over them so that no two threads ever share a cursor
+	def __init__(self, maxFiles:int):
+		self.__maxFiles = maxFiles
+		self.__files:OrderedDict[str, BinFile] = OrderedDict()
+		self.__hits = 0
+		self.__misses = 0
+		self.__lock = Lock()
+
+	def getFile(self, filePath:str) -> BinFile:
+		with self.__lock:
+			file = self.__files.get(filePath)
+
+			if file is not None and not file.isClosed():
+				self.__hits += 1
+				self.__files.move_to_end(filePath)
+
+				return file
+
+			self.__misses += 1
+
+		file = BinFile(filePath, True) # mapped outside of the lock, another thread may race us to it but both maps are valid
+
+		with self.__lock:
+			self.__files[filePath] = file
+			self.__files.move_to_end(filePath)
+
+			self.__evict()
+
+		return file
+
+	def readBlock(self, filePath:str, offset:int = 0, size:int = None) -> BinBlock:
+		file = self.getFile(filePath)
+		fileSz = file.getSize()
+
+		if size is None:
+			size = fileSz - offset
+
+		if offset + size > fileSz:
+			raise Exception(f"Out of range: tried to read {size} at {offset}, but file size is {fileSz}")
+
+		return BinBlock(file, offset, size)
+
+	def __evict(self):
+		# evicted files aren't closed, blocks that were handed out keep their map alive until they are collected
+		while len(self.__files) > self.__maxFiles:
+			self.__files.popitem(last = False)
+
+	def setMaxFiles(self, maxFiles:int):
+		with self.__lock:
+			self.__maxFiles = max(maxFiles, 1)
+
+			self.__evict()
+
+	def clear(self):
+		# like eviction, outstanding blocks keep using their map, it is released once the last of them is collected
+		with self.__lock:
+			self.__files.clear()
+
+	def resetStats(self):
+		self.__hits = 0
+		self.__misses = 0
+
+	def __len__(self):
+		return len(self.__files)
+
+	@property
+	def maxFiles(self):
+		return self.__maxFiles
+
+	def getStats(self):
+		return f"{len(self)}/{self.__maxFiles} files, {self.__hits} hits, {self.__misses} misses"
+
+
+FILE_POOL = FilePool(FILE_POOL_SIZE) # process wide
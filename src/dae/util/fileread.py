@@ -1,6 +1,9 @@
 from io import BufferedReader
 from io import BytesIO
-from struct import pack
+from struct import pack, Struct
+from mmap import mmap, ACCESS_READ
+from os import fstat
+import numpy as np
 # from terminable import Terminable
 
 class BBytesIO(BytesIO):
@@ -15,18 +18,53 @@ class BBytesIO(BytesIO):
 			self.write(string.encode())
 
 class BinFile(BufferedReader):
-	def __init__(self, data:bytes):
+	def __init__(self, data:bytes, mapped:bool = False):
+		self.__map = None
+		self.__filePath = None
+		self.__mTime = 0
+
 		if type(data) == str:
 			file = open(data, "rb")
-			data = file.read()
+
+			self.__filePath = data
+			self.__mTime = fstat(file.fileno()).st_mtime_ns
+
+			if mapped:
+				data = self.__mapFile(file)
+			else:
+				data = file.read()
+			
 			file.close()
 		
 		self.__data = data
 		self.__size = len(data)
 		self.__offset = 0
 	
+	def __mapFile(self, file):
+		# read-only mapping: every read() returns a memoryview slice instead of a copy
+		try:
+			self.__map = mmap(file.fileno(), 0, access = ACCESS_READ)
+		except ValueError: # empty files can't be mapped
+			return b""
+		
+		return memoryview(self.__map)
+	
+	def isMapped(self):
+		return self.__map is not None
+	
+	def __materialize(self):
+		if isinstance(self.__data, memoryview):
+			self.__data = self.__data.tobytes()
+	
 	def getData(self):
 		return self.__data
+	
+	def getFilePath(self):
+		# None when the BinFile wasn't opened from a path
+		return self.__filePath
+	
+	def getMTime(self):
+		return self.__mTime
 
 	def read(self, bytes:int = None):
 		if bytes == None:
@@ -43,6 +81,9 @@ class BinFile(BufferedReader):
 	def tell(self):
 		return self.__offset
 	
+	def absTell(self):
+		return self.__offset
+	
 	def seek(self, bytes:int, whence:int = 0):
 		if whence == 0:
 			self.__offset = 0
@@ -70,6 +111,16 @@ class BinFile(BufferedReader):
 
 	def readRest(self):
 		return self.read(self.getSize() - self.tell())
+	
+	def readArray(self, dtype, count:int) -> np.ndarray:
+		dtype = np.dtype(dtype)
+
+		return np.frombuffer(self.read(dtype.itemsize * count), dtype, count)
+	
+	def readStructArray(self, fmt:str, count:int):
+		struct = getStruct(fmt)
+
+		return struct.iter_unpack(self.read(struct.size * count))
 
 	def quickSave(self, outName:str):
 		file = open(outName, "wb")
@@ -87,6 +138,7 @@ class BinFile(BufferedReader):
 		
 		offset = self.tell()
 
+		self.__materialize()
 		self.__data = self.__data[:offset] + self.__data[offset + size:]
 
 		self.seek(max(offset - size, 0), 0)
@@ -100,6 +152,7 @@ class BinFile(BufferedReader):
 		offset = self.tell()
 		sz = len(data)
 
+		self.__materialize()
 		self.__data = self.__data[:offset] + data + self.__data[offset + sz:]
 
 		self.seek(sz, 1)
@@ -108,12 +161,22 @@ class BinFile(BufferedReader):
 		offset = self.tell()
 		sz = len(data)
 
+		self.__materialize()
 		self.__data = self.__data[:offset] + data + self.__data[offset:]
 		self.__size += sz
 
 		self.seek(sz, 1)
 
 	def close(self):
+		if self.__map is not None:
+			try:
+				self.__data.release()
+				self.__map.close()
+			except BufferError: # slices handed out earlier are still alive, the GC will unmap it
+				pass
+
+			self.__map = None
+
 		self.__data = None
 		self.__size = 0
 		self.__offset = 0
@@ -152,6 +215,12 @@ class BinBlock(BinFile): # guess who accidentally reinvented memoryview() :)
 	def getParent(self):
 		return self.__parent
 	
+	def getFilePath(self):
+		return self.__parent.getFilePath()
+	
+	def getMTime(self):
+		return self.__parent.getMTime()
+	
 	def read(self, bytes:int = None):
 		if bytes == None:
 			return self.getData()[self.__absOffset:self.__maxAbsOffset]
@@ -187,7 +256,20 @@ class BinBlock(BinFile): # guess who accidentally reinvented memoryview() :)
 	
 	def getSize(self):
 		return self.__size
+
+	def close(self):
+		pass # the data belongs to the parent
+
+
+_STRUCTS:dict[str, Struct] = {}
+
+def getStruct(fmt:str) -> Struct:
+	struct = _STRUCTS.get(fmt)
+
+	if struct is None:
+		struct = _STRUCTS[fmt] = Struct(fmt)
 	
+	return struct
 
 def decodeVLQ(file:BinFile, step:int, end:int, breakCond = lambda val: val >= 0, shift:int = 1):
 	result = 0
@@ -203,6 +285,21 @@ def decodeVLQ(file:BinFile, step:int, end:int, breakCond = lambda val: val >= 0,
 	
 	return result
 
+def decodeVLQArray(data:bytes):
+	# every little endian base 128 number of data at once, returns their values and the offset right after each of them
+	b = np.frombuffer(data, np.uint8)
+	ends = np.flatnonzero(b < 0x80) + 1
+
+	if len(ends) == 0:
+		return [], []
+	
+	starts = np.concatenate(([0], ends[:-1]))
+	pos = np.arange(ends[-1])
+	shifts = np.minimum(7 * (pos - np.repeat(starts, ends - starts)), 63).astype(np.uint64)
+	values = np.bitwise_or.reduceat((b[:ends[-1]] & 0x7F).astype(np.uint64) << shifts, starts)
+
+	return values.tolist(), ends.tolist()
+
 def toInt(data:bytes):
 	return int.from_bytes(data,"little")
 
@@ -230,12 +327,23 @@ def readNameMap(file:BufferedReader, cnt:int, indicesOfs:int, ofs:int, parent =
 	for i in rangeFunc(cnt):
 		next = -1 if cnt == i + 1 else readFunc(file) - ofs
 		
-		nameMap.append(nameMapData[prev:next].decode("utf-8").rstrip("\x00"),)
+		nameMap.append(str(nameMapData[prev:next], "utf-8").rstrip("\x00"),)
 		
 		prev = next
 	
 	return nameMap
 
+ROW_CHUNK = 0x4000
+
+def writeRows(file, rowFmt:str, rows:np.ndarray, parent = None):
+	# %-formats whole chunks of rows at once, rowFmt holds the placeholders for a single row
+	rangeFunc = (lambda *x: parent.SafeRange(parent, *x)) if parent is not None else (lambda *x: range(*x))
+
+	for start in rangeFunc(0, len(rows), ROW_CHUNK):
+		chunk = rows[start:start + ROW_CHUNK]
+
+		file.write((rowFmt * len(chunk)) % tuple(chunk.ravel().tolist()))
+
 def readShort(file:BufferedReader) -> int:
 	return readEx(2,file)
 
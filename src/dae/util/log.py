@@ -5,7 +5,7 @@ sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
 from time import time
 from util.enums import *
-from threading import currentThread
+from threading import currentThread, Lock
 
 startTime = time()
 
@@ -14,19 +14,21 @@ def getTime():
 
 curLevel = 0
 levelStr = ""
+levelLock = Lock()
 
 def incrLevel(level:int = 0):
 	global curLevel
 	global levelStr
 
-	curLevel += level
-	levelStr = ""
+	with levelLock:
+		curLevel += level
+		levelStr = ""
 
-	if curLevel < 0:
-		raise Exception(f"Impossible level {curLevel}")
+		if curLevel < 0:
+			raise Exception(f"Impossible level {curLevel}")
 
-	for i in range(curLevel):
-		levelStr += "    "
+		for i in range(curLevel):
+			levelStr += "    "
 
 def addLevel(level:int = 1):
 	incrLevel(level)
@@ -0,0 +1,87 @@
+import sys
+from os import path
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from collections import OrderedDict
+from threading import Lock
+
+class LRUCache:
+	def __init__(self, budget:int):
+		self.__budget = budget
+		self.__size = 0
+		self.__entries:OrderedDict = OrderedDict() # key -> (value, size)
+		self.__hits = 0
+		self.__misses = 0
+		self.__lock = Lock()
+
+	def get(self, key, default = None):
+		with self.__lock:
+			entry = self.__entries.get(key)
+
+			if entry is None:
+				self.__misses += 1
+
+				return default
+
+			self.__hits += 1
+			self.__entries.move_to_end(key)
+
+			return entry[0]
+
+	def put(self, key, value, size:int):
+		with self.__lock:
+			if key in self.__entries:
+				self.__size -= self.__entries.pop(key)[1]
+
+			if size > self.__budget: # would evict everything else for nothing
+				return
+
+			self.__entries[key] = (value, size)
+			self.__size += size
+
+			self.__evict()
+
+	def __evict(self):
+		while self.__size > self.__budget:
+			self.__size -= self.__entries.popitem(last = False)[1][1]
+
+	def setBudget(self, budget:int):
+		with self.__lock:
+			self.__budget = budget
+
+			self.__evict()
+
+	def clear(self):
+		with self.__lock:
+			self.__entries.clear()
+			self.__size = 0
+	
+	def resetStats(self):
+		self.__hits = 0
+		self.__misses = 0
+
+	def __contains__(self, key):
+		return key in self.__entries
+
+	def __len__(self):
+		return len(self.__entries)
+
+	@property
+	def budget(self):
+		return self.__budget
+
+	@property
+	def size(self):
+		return self.__size
+	
+	@property
+	def hits(self):
+		return self.__hits
+	
+	@property
+	def misses(self):
+		return self.__misses
+	
+	def getStats(self):
+		return f"{len(self)} entries, {self.__size}/{self.__budget} bytes, {self.__hits} hits, {self.__misses} misses"
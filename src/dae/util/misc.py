@@ -3,6 +3,7 @@ import math
 from os import path
 from ctypes import cdll
 from typing import Iterable
+import numpy as np
 from PyQt5.QtCore import QDir, Qt
 from PyQt5.QtWidgets import QFileDialog, QDialog
 
@@ -65,6 +66,15 @@ def vectorTransform(matrix, vector):
 
 	return result
 
+def vectorsTransform(matrix, vectors:np.ndarray) -> np.ndarray:
+	vectors = np.asarray(vectors, dtype = np.float64).reshape(-1, 3)
+	result = np.empty_like(vectors)
+
+	for i in range(3):
+		result[:, i] = vectors[:, 0] * matrix[i][0] + vectors[:, 1] * matrix[i][1] + vectors[:, 2] * matrix[i][2] + matrix[i][3]
+	
+	return result
+
 def matrixToEuler(matrix):
 	r11, r12, r13 = matrix[0][:3]
 	r21, r22, r23 = matrix[1][:3]
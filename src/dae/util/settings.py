@@ -27,6 +27,8 @@ class Settings:
 		SETTINGS_DONT_EXPORT_EXISTING_TEXTURES:False,
 		SETTINGS_FORCE_DDS_CONVERSION:True,
 		SETTINGS_EXPAND_ALL:False,
+		SETTINGS_DECOMPRESSED_CACHE_SIZE:DECOMPRESSED_CACHE_SIZE // 0x100000, # MB
+		SETTINGS_FILE_POOL_SIZE:FILE_POOL_SIZE,
 	}
 
 	def saveSettings(self):
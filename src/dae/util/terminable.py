@@ -8,6 +8,7 @@ import util.log as log
 from PyQt5.QtCore import QObject
 from abc import ABC, abstractmethod
 from util.fileread import BinFile
+from util.filepool import FILE_POOL
 from typing import Iterable, Reversible
 
 class Terminable:
@@ -230,15 +231,7 @@ class Packed(Exportable):
 
 	def getBin(self) -> BinFile:
 		if self.__cachedBin is None or self.__cachedBin.isClosed():
-			file = open(self.filePath, "rb")
-
-			file.seek(self.offset, 1)
-
-			bin = BinFile(file.read(self.size))
-
-			file.close()
-
-			return bin
+			return FILE_POOL.readBlock(self.filePath, self.offset, self.size)
 		else:
 			return self.__cachedBin
 
@@ -263,11 +256,7 @@ class Pack(Exportable):
 		self.__cachedBin = None
 	
 	def enableCaching(self):
-		f = open(self.filePath, "rb")
-		file = BinFile(f.read())
-		f.close()
-
-		self.__cachedBin = file
+		self.__cachedBin = BinFile(self.filePath, True)
 	
 	def clearCache(self):
 		self.__cachedBin.close()
@@ -0,0 +1,81 @@
+import sys
+from os import path, cpu_count
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import util.log as log
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from traceback import format_exc
+from util.terminable import Terminable
+from util.enums import TEXTURE_PIPELINE_BUDGET
+
+def _produce(func, args:tuple):
+	try:
+		return func(*args), None
+	except Exception:
+		return None, format_exc()
+
+class TexturePipeline(Terminable):
+	# decompression and conversion run on a thread pool (zstd, zlib, lzma and the DLL codecs release the GIL), the caller's thread writes
+	def __init__(self, workers:int = None, budget:int = TEXTURE_PIPELINE_BUDGET):
+		self.__workers = workers if workers is not None else (cpu_count() or 1)
+		self.__budget = budget
+
+	@property
+	def workers(self):
+		return self.__workers
+
+	def __write(self, result):
+		if result is None:
+			return
+
+		output, data = result
+
+		file = open(output, "wb")
+		file.write(data)
+		file.close()
+
+		log.log(f"Wrote {len(data)} bytes to {output}")
+
+	def run(self, jobs:list[tuple[object, tuple, int]]):
+		# jobs are (function returning (output path, data) or None, its args, expected size of data), yields (job index, error traceback or None) once written
+		# jobs are only submitted while the expected size of everything in flight stays within the budget
+		pending = {}
+		inFlight = 0
+
+		with ThreadPoolExecutor(max(1, min(self.__workers, len(jobs)))) as pool:
+			try:
+				for k, (func, args, size) in enumerate(jobs):
+					while pending and inFlight + size > self.__budget and not self.shouldTerminate:
+						for idx, error in self.__drain(pending):
+							inFlight -= jobs[idx][2]
+
+							yield idx, error
+
+					if self.shouldTerminate:
+						break
+
+					pending[pool.submit(_produce, func, args)] = k
+					inFlight += size
+
+				while pending and not self.shouldTerminate:
+					for idx, error in self.__drain(pending):
+						yield idx, error
+			finally:
+				for future in pending:
+					future.cancel()
+
+	def __drain(self, pending:dict):
+		done, _ = wait(pending, return_when = FIRST_COMPLETED)
+
+		for future in done:
+			idx = pending.pop(future)
+			result, error = future.result()
+
+			if error is None:
+				try:
+					self.__write(result)
+				except Exception:
+					error = format_exc()
+
+			yield idx, error